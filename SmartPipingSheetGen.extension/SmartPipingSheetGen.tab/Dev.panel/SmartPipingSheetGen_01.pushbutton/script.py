@@ -32,9 +32,12 @@ from Autodesk.Revit.DB import *
 from Autodesk.Revit.DB import (
     BuiltInCategory,
     BuiltInParameter,
+    BoundingBoxIntersectsFilter,
     ElementId,
+    ElementOwnerViewFilter,
     FamilySymbol,
     FamilyInstance,
+    FamilyInstanceFilter,
     FilteredElementCollector,
     FormatOptions,
     FilterStringRule,
@@ -42,14 +45,19 @@ from Autodesk.Revit.DB import (
     FilterStringBeginsWith,
     FilterStringContains,
     FilterStringEquals,
+    LogicalOrFilter,
+    Outline,
     XYZ,
     Transaction,
+    TransactionGroup,
+    SubTransaction,
     TextNote,
     TextNoteType,
     TextNoteOptions,
     IndependentTag,
     UV,
     UnitTypeId,
+    UnitUtils,
     Reference,
     TagMode,
     TagOrientation,
@@ -101,11 +109,17 @@ from System.Windows.Forms import (
     PictureBox,
     PictureBoxSizeMode,
     DataGridView,
+    DataGridViewColumn,
     DataGridViewTextBoxColumn,
     DataGridViewButtonColumn,
     DataGridViewAutoSizeColumnsMode,
+    DataGridViewAutoSizeRowsMode,
+    DataGridViewColumnSortMode,
+    DataGridViewElementStates,
+    DataGridViewRowHeadersWidthSizeMode,
     DataGridViewSelectionMode,
     DockStyle,
+    SortOrder,
     TextBox,
     Button,
     MessageBox,
@@ -116,6 +130,7 @@ from System.Windows.Forms import (
 )
 from System.Drawing import Image, Point, Color, Rectangle, Size
 from System.IO import MemoryStream
+from System.Reflection import BindingFlags
 from System.Windows.Forms import DataGridViewButtonColumn
 
 from System import Array
@@ -130,6 +145,54 @@ doc = __revit__.ActiveUIDocument.Document
 
 VERBOSE = False
 
+# Fittings written per Transaction before committing and starting a new one
+FIX_BATCH_SIZE = 50
+
+# Elbows on a vertical pipe wider than 100 mm get 2x45°; kept in internal
+# units (feet) so the diameter can be compared without converting
+ELBOW_2X45_MIN_DIAM = UnitUtils.ConvertToInternalUnits(100, UnitTypeId.Millimeters)
+
+# Pipe tag placement settings shared by every IndependentTag.Create call
+TAG_MODE = TagMode.TM_ADDBY_CATEGORY
+TAG_ORIENTATION = TagOrientation.Horizontal
+
+# .NET enum members named "None" can't be written as an attribute in Python
+AUTOSIZE_COLUMNS_NONE = getattr(DataGridViewAutoSizeColumnsMode, "None")
+AUTOSIZE_ROWS_NONE = getattr(DataGridViewAutoSizeRowsMode, "None")
+SORT_ORDER_NONE = getattr(SortOrder, "None")
+
+# Revit 2022+ tags can reference several elements (GetTaggedElementIds,
+# returning LinkElementIds); older versions only have TaggedElementId.
+# Probed once on the class instead of per tag.
+_HAS_MULTIREF = hasattr(IndependentTag, "GetTaggedElementIds")
+
+# Before that, TaggedElementId is a LinkElementId (unwrapped through
+# HostElementId) on most versions and a plain ElementId on the oldest ones.
+# Read once from the property type instead of probing every tag's id.
+_TAGGED_ID_PROP = clr.GetClrType(IndependentTag).GetProperty("TaggedElementId")
+_TAGGED_ID_IS_LINK = _TAGGED_ID_PROP is not None and (
+    _TAGGED_ID_PROP.PropertyType == clr.GetClrType(LinkElementId)
+)
+
+# Revit 2022+ has a FilterStringRule(provider, evaluator, text) constructor;
+# older versions only take the extra caseSensitive argument.
+# Probed once on the class instead of per rule.
+_HAS_3ARG_STRING_RULE = any(
+    len(c.GetParameters()) == 3
+    for c in clr.GetClrType(FilterStringRule).GetConstructors()
+)
+
+# Base code ("4.1.1") pulled out of the text-note string
+_BASE_RE = re.compile(r"([\d\.]+)")
+
+# Editor grid row colour per category, applied in CellFormatting
+CATEGORY_ROW_COLORS = {
+    "Pipes": Color.LightBlue,
+    "Pipe Tags": Color.LightGreen,
+    "Text Notes": Color.LightGray,
+    "Pipe Fittings": Color.LightGoldenrodYellow,
+}
+
 
 def debug(*args):
     if VERBOSE:
@@ -142,13 +205,13 @@ def debug(*args):
 
 
 # --- Boundary Selection Functions ---
+_OST_LINES_INT = int(BuiltInCategory.OST_Lines)
+
+
 class DetailLineSelectionFilter(ISelectionFilter):
     def AllowElement(self, elem):
-        if elem.Category and elem.Category.Id.IntegerValue == int(
-            BuiltInCategory.OST_Lines
-        ):
-            return True
-        return False
+        cat = elem.Category
+        return cat is not None and cat.Id.IntegerValue == _OST_LINES_INT
 
     def AllowReference(self, ref, point):
         return False
@@ -162,27 +225,56 @@ def points_are_close(pt1, pt2, tol=1e-6):
     )
 
 
+# bucket offsets probed around a quantised endpoint, exact bucket first
+_NEIGHBOUR_OFFSETS = [
+    (dx, dy, dz) for dx in (0, -1, 1) for dy in (0, -1, 1) for dz in (0, -1, 1)
+]
+
+
+def _point_key(pt, tol=1e-6):
+    return (
+        int(round(pt.X / tol)),
+        int(round(pt.Y / tol)),
+        int(round(pt.Z / tol)),
+    )
+
+
 def order_segments_to_polygon(segments):
     if not segments:
         return None
+    # quantised endpoint -> indexes of the segments that touch it
+    endpoint_index = {}
+    for idx, (ptA, ptB) in enumerate(segments):
+        endpoint_index.setdefault(_point_key(ptA), []).append(idx)
+        endpoint_index.setdefault(_point_key(ptB), []).append(idx)
+
+    used = [False] * len(segments)
+    used[0] = True
+    remaining = len(segments) - 1
     polygon = [segments[0][0], segments[0][1]]
-    segments.pop(0)
-    changed = True
-    while segments and changed:
-        changed = False
+    while remaining:
         last_pt = polygon[-1]
-        for idx, seg in enumerate(segments):
-            ptA, ptB = seg
-            if points_are_close(last_pt, ptA):
-                polygon.append(ptB)
-                segments.pop(idx)
-                changed = True
+        kx, ky, kz = _point_key(last_pt)
+        next_pt = None
+        for dx, dy, dz in _NEIGHBOUR_OFFSETS:
+            for idx in endpoint_index.get((kx + dx, ky + dy, kz + dz), ()):
+                if used[idx]:
+                    continue
+                ptA, ptB = segments[idx]
+                if points_are_close(last_pt, ptA):
+                    next_pt = ptB
+                elif points_are_close(last_pt, ptB):
+                    next_pt = ptA
+                else:
+                    continue
+                used[idx] = True
                 break
-            elif points_are_close(last_pt, ptB):
-                polygon.append(ptA)
-                segments.pop(idx)
-                changed = True
+            if next_pt is not None:
                 break
+        if next_pt is None:
+            break
+        polygon.append(next_pt)
+        remaining -= 1
     if polygon and points_are_close(polygon[0], polygon[-1]):
         polygon.pop()
         return polygon
@@ -190,10 +282,10 @@ def order_segments_to_polygon(segments):
         return None
 
 
-def is_point_inside_polygon(point, polygon):
-    x = point.X
-    y = point.Y
-    inside = False
+def polygon_edges(polygon):
+    """Precompute (yi, yj, xi, dx/dy) per edge so the ray-cast below does no
+    XYZ property reads or divisions per tested point."""
+    edges = []
     n = len(polygon)
     j = n - 1
     for i in range(n):
@@ -201,11 +293,16 @@ def is_point_inside_polygon(point, polygon):
         yi = polygon[i].Y
         xj = polygon[j].X
         yj = polygon[j].Y
-        if ((yi > y) != (yj > y)) and (
-            x < (xj - xi) * (y - yi) / ((yj - yi) or 1e-12) + xi
-        ):
-            inside = not inside
+        edges.append((yi, yj, xi, (xj - xi) / ((yj - yi) or 1e-12)))
         j = i
+    return edges
+
+
+def is_point_inside_polygon(x, y, edges):
+    inside = False
+    for yi, yj, xi, slope in edges:
+        if ((yi > y) != (yj > y)) and (x < slope * (y - yi) + xi):
+            inside = not inside
     return inside
 
 
@@ -232,28 +329,42 @@ def select_boundary_and_gather():
         except Exception:
             continue
 
-    polygon = order_segments_to_polygon(segments[:])
+    polygon = order_segments_to_polygon(segments)
     if polygon is None:
         MessageBox.Show(
             "The selected detail lines do not form a closed boundary.", "Error"
         )
         return None
 
+    edges = polygon_edges(polygon)
+    min_x = min(pt.X for pt in polygon)
+    max_x = max(pt.X for pt in polygon)
+    min_y = min(pt.Y for pt in polygon)
+    max_y = max(pt.Y for pt in polygon)
+
+    # Let Revit drop model elements whose box misses the boundary rectangle
+    # (any height); view-owned annotation always passes to the exact test.
+    view = uidoc.ActiveView
+    outline = Outline(XYZ(min_x, min_y, -1.0e6), XYZ(max_x, max_y, 1.0e6))
+    region_filter = LogicalOrFilter(
+        BoundingBoxIntersectsFilter(outline), ElementOwnerViewFilter(view.Id)
+    )
     collector = (
-        FilteredElementCollector(doc, uidoc.ActiveView.Id)
+        FilteredElementCollector(doc, view.Id)
         .WhereElementIsNotElementType()
-        .ToElements()
+        .WherePasses(region_filter)
     )
+
     elements_inside = []
     for elem in collector:
         bbox = elem.get_BoundingBox(uidoc.ActiveView)
         if bbox:
-            center = XYZ(
-                (bbox.Min.X + bbox.Max.X) / 2.0,
-                (bbox.Min.Y + bbox.Max.Y) / 2.0,
-                (bbox.Min.Z + bbox.Max.Z) / 2.0,
-            )
-            if is_point_inside_polygon(center, polygon):
+            cx = (bbox.Min.X + bbox.Max.X) / 2.0
+            cy = (bbox.Min.Y + bbox.Max.Y) / 2.0
+            # cheap rectangle rejection before the edge loop
+            if cx < min_x or cx > max_x or cy < min_y or cy > max_y:
+                continue
+            if is_point_inside_polygon(cx, cy, edges):
                 elements_inside.append(elem)
 
     MessageBox.Show(
@@ -266,6 +377,141 @@ def select_boundary_and_gather():
 
 
 # --- Parameter and Region Helpers ---
+# lower-cased family name per FamilySymbol id; fittings of one type share it
+_family_name_cache = {}
+# family-name keywords the fitting logic dispatches on
+FAMILY_KEYWORDS = ("bocht", "multibocht", "liggend", "multireducer_geb")
+# {symbol id: frozenset of FAMILY_KEYWORDS found in its family name}
+_family_flags_cache = {}
+
+
+def get_family_name_lc(elem):
+    symbol = elem.Symbol
+    if symbol is None:
+        return ""
+    key = symbol.Id.IntegerValue
+    name = _family_name_cache.get(key)
+    if name is None:
+        family = symbol.Family if symbol.IsValidObject else None
+        name = family.Name.lower() if family else ""
+        _family_name_cache[key] = name
+    return name
+
+
+def get_family_flags(elem):
+    """Keywords from FAMILY_KEYWORDS in the fitting's family name, matched
+    once per symbol so callers dispatch with a set membership test."""
+    symbol = elem.Symbol
+    if symbol is None:
+        return frozenset()
+    key = symbol.Id.IntegerValue
+    flags = _family_flags_cache.get(key)
+    if flags is None:
+        name = get_family_name_lc(elem)
+        flags = frozenset(k for k in FAMILY_KEYWORDS if k in name)
+        _family_flags_cache[key] = flags
+    return flags
+
+
+# parameters read/written on fittings by Fix Reducers
+FITTING_PARAM_NAMES = frozenset(
+    [
+        "waarschuwing",
+        "kort_verloop (kleinste)",
+        "kort_verloop (grootste)",
+        "reducer_eccentric",
+        "switch_excentriciteit",
+        "2x45°",
+    ]
+)
+# {symbol id: {param name: Definition}} resolved once per FamilySymbol
+_param_def_cache = {}
+
+
+def lookup_fitting_param(elem, name):
+    """LookupParameter replacement for fittings: the parameter set is scanned
+    once per symbol, later lookups go through get_Parameter(Definition)."""
+    if name not in FITTING_PARAM_NAMES or not isinstance(elem, FamilyInstance):
+        return elem.LookupParameter(name)
+    key = elem.Symbol.Id.IntegerValue
+    defs = _param_def_cache.get(key)
+    if defs is None:
+        defs = {}
+        for p in elem.Parameters:
+            pname = p.Definition.Name
+            if pname in FITTING_PARAM_NAMES and pname not in defs:
+                defs[pname] = p.Definition
+        _param_def_cache[key] = defs
+    definition = defs.get(name)
+    if definition is None:
+        return None
+    return elem.get_Parameter(definition)
+
+
+def set_yesno_param(param, on):
+    """Write a Yes/No parameter only when it differs from the target, so
+    re-runs don't dirty elements; returns True if a write happened."""
+    value = 1 if on else 0
+    if param.AsInteger() == value:
+        return False
+    param.Set(value)
+    return True
+
+
+def get_vertical_connections(elem):
+    """Walk the connectors of a fitting once and return (BasisZ, owners) for
+    every vertical connector; owners are (id int, element) pairs, self excluded."""
+    mep = elem.MEPModel
+    if mep is None or mep.ConnectorManager is None:
+        return []
+    elem_id_int = elem.Id.IntegerValue
+    links = []
+    for conn in mep.ConnectorManager.Connectors:
+        basis_z = conn.CoordinateSystem.BasisZ
+        if abs(basis_z.Z) <= 0.9:
+            continue
+        owners = []
+        for ref in conn.AllRefs:
+            owner = ref.Owner
+            oid_int = owner.Id.IntegerValue
+            if oid_int != elem_id_int:
+                owners.append((oid_int, owner))
+        links.append((basis_z, owners))
+    return links
+
+
+def is_connected_upward(elem):
+    """True as soon as an upward connector of the fitting is found to be
+    connected to another element; stops at the first hit."""
+    mep = elem.MEPModel
+    if mep is None or mep.ConnectorManager is None:
+        return False
+    elem_id_int = elem.Id.IntegerValue
+    for conn in mep.ConnectorManager.Connectors:
+        if conn.CoordinateSystem.BasisZ.Z <= 0.9:
+            continue
+        for ref in conn.AllRefs:
+            if ref.Owner.Id.IntegerValue != elem_id_int:
+                return True
+    return False
+
+
+# instance "Comments", read by id instead of walking the parameters by name
+COMMENTS_BIP = BuiltInParameter.ALL_MODEL_INSTANCE_COMMENTS
+
+# parameters read from a pipe, both for its own row and for its tags' rows,
+# keyed by the names the rows use
+PIPE_PARAMS = (
+    ("Comments", COMMENTS_BIP),
+    ("Outside Diameter", BuiltInParameter.RBS_PIPE_OUTER_DIAMETER),
+    ("Length", BuiltInParameter.CURVE_ELEM_LENGTH),
+)
+
+
+def get_params(elem, params):
+    return {name: elem.get_Parameter(bip) for name, bip in params}
+
+
 def convert_param_to_string(param_obj):
     if not param_obj:
         return ""
@@ -292,15 +538,13 @@ def get_region_bounding_box(elements):
     overall_max_y = float("-inf")
     overall_max_z = float("-inf")
 
+    view = uidoc.ActiveView
     for el in elements:
-        try:
-            bbox = el.get_BoundingBox(uidoc.ActiveView)
-        except:
+        if not el.IsValidObject:
             continue  # skip if element was just deleted
+        bbox = el.get_BoundingBox(view)
         if not bbox:
             continue
-        if bbox is None:
-            continue
         if (
             bbox.Min.X == float("inf")
             or bbox.Min.Y == float("inf")
@@ -323,6 +567,112 @@ def get_region_bounding_box(elements):
     return overall_min, overall_max
 
 
+def tag_host_ids(tag):
+    """Int ids of the host elements a pipe tag is attached to."""
+    if _HAS_MULTIREF:
+        return [rid.HostElementId.IntegerValue for rid in tag.GetTaggedElementIds()]
+    rid = tag.TaggedElementId
+    if _TAGGED_ID_IS_LINK:
+        return [rid.HostElementId.IntegerValue]
+    return [rid.IntegerValue]
+
+
+def build_tag_host_map(doc):
+    """{host element int id: [pipe tags on it]} from one pass over the pipe
+    tags in the document."""
+    pipe_tags = (
+        FilteredElementCollector(doc)
+        .OfCategory(BuiltInCategory.OST_PipeTags)
+        .WhereElementIsNotElementType()
+    )
+
+    tag_by_host = {}
+    for tag in pipe_tags:
+        for hid in tag_host_ids(tag):
+            tag_by_host.setdefault(hid, []).append(tag)
+    return tag_by_host
+
+
+# {element id: XYZ bounding-box centre in the active view, or None}
+_centroid_cache = {}
+
+
+def get_bbox_center(elem):
+    """XYZ centre of the element's bounding box in the active view, or None.
+    Cached so tag placement, the editor's auto-fill and the final renumber
+    share one get_BoundingBox call per element."""
+    key = elem.Id.IntegerValue
+    if key in _centroid_cache:
+        return _centroid_cache[key]
+    bbox = elem.get_BoundingBox(uidoc.ActiveView)
+    ctr = None
+    if bbox:
+        ctr = (bbox.Min + bbox.Max) * 0.5
+    _centroid_cache[key] = ctr
+    return ctr
+
+
+# text note types, collected once on first use
+_text_note_types = None
+
+
+def get_text_note_types():
+    """All TextNoteTypes in the document, materialised once so the editor's
+    text note, the region-corner note and the schedule text type lookup share
+    a single collector pass."""
+    global _text_note_types
+    if _text_note_types is None:
+        _text_note_types = list(
+            FilteredElementCollector(doc).OfClass(TextNoteType).ToElements()
+        )
+    return _text_note_types
+
+
+def get_default_text_note_type():
+    """First TextNoteType in the document, or None."""
+    types = get_text_note_types()
+    return types[0] if types else None
+
+
+class SwallowWarnings(IFailuresPreprocessor):
+    """Drops warnings at commit so they never open a dialog mid-run; errors
+    are left to Revit's normal handling."""
+
+    def PreprocessFailures(self, failuresAccessor):
+        failuresAccessor.DeleteAllWarnings()
+        return FailureProcessingResult.Continue
+
+
+def suppress_warnings(tx):
+    """Attach SwallowWarnings to a started transaction."""
+    opts = tx.GetFailureHandlingOptions()
+    opts.SetFailuresPreprocessor(SwallowWarnings())
+    opts.SetForcedModalHandler(False)
+    opts.SetClearAfterRollback(True)
+    tx.SetFailureHandlingOptions(opts)
+
+
+# Plan sort keys: coordinates in 1/1000 ft, biased so negatives stay ordered
+_SORT_KEY_SCALE = 1000.0
+_SORT_KEY_BIAS = 1 << 31
+_SORT_KEY_MAX = (1 << 32) - 1
+
+
+def pack_plan_key(x, y):
+    """One int that orders like (x, y), so a sort compares single ints."""
+    xi = min(max(int(round(x * _SORT_KEY_SCALE)) + _SORT_KEY_BIAS, 0), _SORT_KEY_MAX)
+    yi = min(max(int(round(y * _SORT_KEY_SCALE)) + _SORT_KEY_BIAS, 0), _SORT_KEY_MAX)
+    return (xi << 32) | yi
+
+
+def get_plan_sort_key(elem):
+    """pack_plan_key of the element's bounding-box centre, or None."""
+    ctr = get_bbox_center(elem)
+    if ctr is None:
+        return None
+    return pack_plan_key(ctr.X, ctr.Y)
+
+
 def create_pipe_tags_for_untagged_pipes(doc, pipes, view):
     t = Transaction(doc, "Add Missing Pipe Tags")
     t.Start()
@@ -341,8 +691,8 @@ def create_pipe_tags_for_untagged_pipes(doc, pipes, view):
             view.Id,
             pipe_ref,
             True,
-            TagMode.TM_ADDBY_CATEGORY,
-            TagOrientation.Horizontal,
+            TAG_MODE,
+            TAG_ORIENTATION,
             UV(center.X, center.Y),
         )
     t.Commit()
@@ -352,7 +702,7 @@ def create_pipe_tags_for_untagged_pipes(doc, pipes, view):
 # UI Class: ElementEditorForm
 # ==================================================
 class ElementEditorForm(Form):
-    def __init__(self, elements_data, region_elements=None):
+    def __init__(self, elements_data, region_elements=None, tag_by_host=None):
         self.Text = "Edit Element Codes"
         self.Width = 1050
         self.Height = 500
@@ -372,10 +722,24 @@ class ElementEditorForm(Form):
         self.Controls.Add(self.gridPanel)
 
         self.dataGrid = DataGridView()
+        # DoubleBuffered is protected on Control; set it through reflection
+        # so scrolling and selection repaint without flicker
+        clr.GetClrType(DataGridView).GetProperty(
+            "DoubleBuffered", BindingFlags.Instance | BindingFlags.NonPublic
+        ).SetValue(self.dataGrid, True, None)
         self.dataGrid.SelectionChanged += self.on_row_selected
         self.dataGrid.Dock = DockStyle.Fill
         self.dataGrid.AutoSizeColumnsMode = DataGridViewAutoSizeColumnsMode.Fill
         self.dataGrid.CellContentClick += self.dataGrid_CellContentClick
+        # Cell values live in self.rows_data and are served on demand
+        self.dataGrid.VirtualMode = True
+        self.dataGrid.AllowUserToAddRows = False
+        self.dataGrid.CellValueNeeded += self.dataGrid_CellValueNeeded
+        self.dataGrid.CellValuePushed += self.dataGrid_CellValuePushed
+        self.dataGrid.CellFormatting += self.dataGrid_CellFormatting
+        self.dataGrid.CellBeginEdit += self.dataGrid_CellBeginEdit
+        # VirtualMode has no built-in sort; headers sort rows_data instead
+        self.dataGrid.ColumnHeaderMouseClick += self.dataGrid_ColumnHeaderMouseClick
         self.dataGrid.MultiSelect = True
         self.dataGrid.SelectionMode = DataGridViewSelectionMode.FullRowSelect
         self.gridPanel.Controls.Add(self.dataGrid)
@@ -445,7 +809,7 @@ class ElementEditorForm(Form):
         self.colTagStatus.UseColumnTextForButtonValue = False
 
         self.dataGrid.Columns.AddRange(
-            Array[DataGridViewTextBoxColumn](
+            Array[DataGridViewColumn](
                 [
                     self.colId,
                     self.colCategory,
@@ -457,11 +821,14 @@ class ElementEditorForm(Form):
                     self.colOD,
                     self.colLength,
                     self.colSize,
+                    self.colArticle,
+                    self.colTagStatus,
                 ]
             )
         )
-        self.dataGrid.Columns.Add(self.colArticle)
-        self.dataGrid.Columns.Add(self.colTagStatus)
+        for col in self.dataGrid.Columns:
+            if col.Name != "TagStatus":
+                col.SortMode = DataGridViewColumnSortMode.Programmatic
 
         # 1. Text Note Code Input with Example Text
         self.txtTextNoteCode = TextBox()
@@ -521,84 +888,198 @@ class ElementEditorForm(Form):
 
         # --- 6. State
         self.textNotePlaced = False
+        # region elements by id, so row lookups skip doc.GetElement
+        self._elem_by_id = dict((e.Id.IntegerValue, e) for e in (region_elements or ()))
+        # seeded from MAIN's build_tag_host_map() when available
+        self._tag_index = None
+        if tag_by_host is not None:
+            self._tag_index = dict(
+                (hid, tags[0].Id) for hid, tags in tag_by_host.items()
+            )
         self.Result = None
 
         # --- 7. Populate Rows
+        # The grid runs in VirtualMode: each row is a dict in self.rows_data
+        # keyed by column name, so only the visible cells are ever materialised.
+        self._col_names = [c.Name for c in self.dataGrid.Columns]
+        self.rows_data = []
+        # (column name, descending) of the last header sort
+        self._sort_state = None
         for ed in elements_data:
-            row_idx = self.dataGrid.Rows.Add()
-            row = self.dataGrid.Rows[row_idx]
-            row.Cells["Id"].Value = ed["Id"]
-            row.Cells["Category"].Value = ed["Category"]
-            row.Cells["Name"].Value = ed["Name"]
-            row.Cells["Warning"].Value = ed.get("Warning", "")
-            row.Cells["Bend45"].Value = ed.get("Bend45", "")
-            row.Cells["GEB_Article_Number"].Value = ed.get("GEB_Article_Number", "")
-            row.Cells["DefaultCode"].Value = ed["DefaultCode"]
-            row.Cells["NewCode"].Value = ed["NewCode"]
-            row.Cells["OutsideDiameter"].Value = ed["OutsideDiameter"]
-            row.Cells["Length"].Value = ed["Length"]
-            row.Cells["Size"].Value = ed.get("Size", "")
+            data = dict(ed)
+            for key in ("Warning", "Bend45", "GEB_Article_Number", "Size"):
+                data.setdefault(key, "")
+            # per-row lock on the TagStatus button (a grid cell's ReadOnly
+            # would unshare the row); enforced in CellBeginEdit/CellContentClick
+            data["TagStatusReadOnly"] = False
 
             # TagStatus logic
             cat = ed["Category"]
             name = ed["Name"]
             name_lc = name.lower()
-            warning_val = row.Cells["Warning"].Value or ""
             debug(">> Pipe Fitting Name:", name)
 
             if cat == "Pipes":
                 if ed["TagStatus"] == "Yes":
-                    row.Cells["TagStatus"].Value = "Remove Tag"
+                    data["TagStatus"] = "Remove Tag"
                 else:
-                    row.Cells["TagStatus"].Value = "Add/Place Tag"
-                row.DefaultCellStyle.BackColor = Color.LightBlue
+                    data["TagStatus"] = "Add/Place Tag"
 
             elif cat == "Pipe Tags":
-                row.Cells["TagStatus"].Value = "Remove Tag"
-                row.DefaultCellStyle.BackColor = Color.LightGreen
+                data["TagStatus"] = "Remove Tag"
 
             elif cat == "Text Notes":
-                row.Cells["TagStatus"].Value = ""
-                row.DefaultCellStyle.BackColor = Color.LightGray
+                data["TagStatus"] = ""
 
             elif cat == "Pipe Fittings":
-                elem = doc.GetElement(ElementId(int(ed["Id"])))
-                family_name = ""
+                elem = self._get_elem(int(ed["Id"]))
+                family_flags = frozenset()
                 if isinstance(elem, FamilyInstance):
-                    symbol = elem.Symbol
-                    if symbol and symbol.Family:
-                        family_name = symbol.Family.Name.lower()
+                    family_flags = get_family_flags(elem)
 
-                row.Cells["TagStatus"].Value = ""
-                row.Cells["TagStatus"].ReadOnly = True
+                data["TagStatus"] = ""
+                data["TagStatusReadOnly"] = True
 
                 if "var. dn/od" in name_lc:
-                    if "multibocht" in name_lc or "multibocht" in family_name:
-                        row.Cells["TagStatus"].Value = "Flip 2x45°"
-                        row.Cells["TagStatus"].ReadOnly = False
-                    elif "liggend" in name_lc or "liggend" in family_name:
-                        row.Cells["TagStatus"].Value = "Flip T-stuk"
-                        row.Cells["TagStatus"].ReadOnly = False
-                        # row.DefaultCellStyle.BackColor = Color.LightGoldenrodYellow
-                    elif "multireducer" in name_lc or "multireducer_geb" in family_name:
-                        row.Cells["TagStatus"].Value = "Flip Reducer"
-                        row.Cells["TagStatus"].ReadOnly = False
-
-                row.DefaultCellStyle.BackColor = Color.LightGoldenrodYellow
+                    if "multibocht" in name_lc or "multibocht" in family_flags:
+                        data["TagStatus"] = "Flip 2x45°"
+                        data["TagStatusReadOnly"] = False
+                    elif "liggend" in name_lc or "liggend" in family_flags:
+                        data["TagStatus"] = "Flip T-stuk"
+                        data["TagStatusReadOnly"] = False
+                    elif (
+                        "multireducer" in name_lc or "multireducer_geb" in family_flags
+                    ):
+                        data["TagStatus"] = "Flip Reducer"
+                        data["TagStatusReadOnly"] = False
+
+            self.rows_data.append(data)
+
+        # no auto-sizing while the rows are created; Fill is restored after
+        self.dataGrid.SuspendLayout()
+        self.dataGrid.AutoSizeColumnsMode = AUTOSIZE_COLUMNS_NONE
+        self.dataGrid.AutoSizeRowsMode = AUTOSIZE_ROWS_NONE
+        self.dataGrid.RowHeadersWidthSizeMode = (
+            DataGridViewRowHeadersWidthSizeMode.DisableResizing
+        )
+        self.dataGrid.RowCount = len(self.rows_data)
+        self.dataGrid.RowHeadersWidthSizeMode = (
+            DataGridViewRowHeadersWidthSizeMode.EnableResizing
+        )
+        self.dataGrid.AutoSizeColumnsMode = DataGridViewAutoSizeColumnsMode.Fill
+        self.dataGrid.ResumeLayout(False)
+
+    def dataGrid_CellValueNeeded(self, sender, e):
+        if e.RowIndex < len(self.rows_data):
+            e.Value = self.rows_data[e.RowIndex].get(
+                self._col_names[e.ColumnIndex], ""
+            )
+
+    def dataGrid_CellValuePushed(self, sender, e):
+        if e.RowIndex < len(self.rows_data):
+            self.rows_data[e.RowIndex][self._col_names[e.ColumnIndex]] = e.Value
+
+    def _tag_status_locked(self, row_index):
+        """True if the row's TagStatus button is read-only."""
+        if row_index < 0 or row_index >= len(self.rows_data):
+            return True
+        return self.rows_data[row_index].get("TagStatusReadOnly", False)
+
+    def dataGrid_CellBeginEdit(self, sender, e):
+        if self._col_names[e.ColumnIndex] != "TagStatus":
+            return
+        if self._tag_status_locked(e.RowIndex):
+            e.Cancel = True
+
+    def dataGrid_ColumnHeaderMouseClick(self, sender, e):
+        """Sort rows_data on the clicked column; clicking it again reverses."""
+        column = self.dataGrid.Columns[e.ColumnIndex]
+        if column.SortMode == DataGridViewColumnSortMode.NotSortable:
+            return
+        name = column.Name
+        descending = self._sort_state == (name, False)
+        self.dataGrid.EndEdit()
+        self.rows_data.sort(key=lambda d: d.get(name) or "", reverse=descending)
+        self._sort_state = (name, descending)
+
+        for col in self.dataGrid.Columns:
+            col.HeaderCell.SortGlyphDirection = SORT_ORDER_NONE
+        column.HeaderCell.SortGlyphDirection = (
+            SortOrder.Descending if descending else SortOrder.Ascending
+        )
+        # selection is by index and would now point at other rows
+        self.dataGrid.ClearSelection()
+        self.dataGrid.Invalidate()
+
+    def dataGrid_CellFormatting(self, sender, e):
+        if e.RowIndex < 0 or e.RowIndex >= len(self.rows_data):
+            return
+        color = CATEGORY_ROW_COLORS.get(self.rows_data[e.RowIndex].get("Category"))
+        if color is not None:
+            e.CellStyle.BackColor = color
+
+    def _get_tag_index(self):
+        """{host element int id: tag ElementId}, built on first use and then
+        kept up to date by the add/remove handlers."""
+        if self._tag_index is None:
+            self._tag_index = dict(
+                (hid, tags[0].Id) for hid, tags in build_tag_host_map(doc).items()
+            )
+        return self._tag_index
+
+    def _get_elem(self, eid):
+        """Element for an int id: the region map first, then the document."""
+        elem = self._elem_by_id.get(eid)
+        if elem is None or not elem.IsValidObject:
+            elem = doc.GetElement(ElementId(eid))
+        return elem
+
+    def _find_row(self, category, elem_id):
+        """Index of the row for elem_id in the given category, or None."""
+        # row ids are stored as strings; compare against one converted target
+        id_str = str(elem_id)
+        for i, data in enumerate(self.rows_data):
+            if data["Id"] == id_str and data["Category"] == category:
+                return i
+        return None
+
+    def _remove_row(self, index):
+        """Drop a row from both the backing list and the grid."""
+        del self.rows_data[index]
+        self.dataGrid.Rows.RemoveAt(index)
 
     def auto_fix_inline(self):
+        """Fix the listed fittings; (updated, skipped), or None when the list
+        has no pipe fittings at all."""
         updated = 0
         skipped = 0
 
-        for row in self.dataGrid.Rows:
-            try:
-                cat = row.Cells["Category"].Value
-                if cat != "Pipe Fittings":
-                    continue
+        fitting_rows = [d for d in self.rows_data if d["Category"] == "Pipe Fittings"]
+        # nothing to fix: don't open a transaction group at all
+        if not fitting_rows:
+            return None
 
-                eid = int(str(row.Cells["Id"].Value))
-                elem = doc.GetElement(ElementId(eid))
+        # One outer transaction (re-committed every FIX_BATCH_SIZE fittings)
+        # inside a group, so Revit regenerates per batch instead of per fitting.
+        tg = TransactionGroup(doc, "Fix Reducers")
+        tg.Start()
+        t = Transaction(doc, "AutoFix Reducers")
+        t.Start()
+        batched = 0
+
+        for row in fitting_rows:
+            # each fitting gets its own rollback point so one failure
+            # doesn't poison the whole batch
+            st = SubTransaction(doc)
+            st.Start()
+            # this fitting's counts; only added to the totals once it commits
+            fit_updated = 0
+            fit_skipped = 0
+            try:
+                eid = int(str(row["Id"]))
+                elem = self._get_elem(eid)
                 if not elem or not elem.IsValidObject:
+                    st.RollBack()
                     continue
 
                 name = elem.Name
@@ -606,14 +1087,14 @@ class ElementEditorForm(Form):
 
                 # 1. Fix concentric reducers
                 reducer_fixed = False
-                p_warn = elem.LookupParameter("waarschuwing")
+                p_warn = lookup_fitting_param(elem, "waarschuwing")
                 warning = p_warn.AsString() if p_warn else ""
                 debug(" -> Warning:", warning)
 
                 has_concentric_warning = warning and "concentric" in warning.lower()
 
                 has_reducer_params = any(
-                    elem.LookupParameter(pn)
+                    lookup_fitting_param(elem, pn)
                     for pn in [
                         "kort_verloop (kleinste)",
                         "kort_verloop (grootste)",
@@ -628,153 +1109,131 @@ class ElementEditorForm(Form):
                         "reducer_eccentric": True,
                         "switch_excentriciteit": False,
                     }
-                    t = Transaction(doc, "Fix Reducer")
-                    t.Start()
+                    # unchanged values are not re-written, but the fitting still
+                    # counts as updated, as it did before the write skipping
                     for pname, value in param_map.items():
-                        p = elem.LookupParameter(pname)
+                        p = lookup_fitting_param(elem, pname)
                         if p and p.StorageType == StorageType.Integer:
-                            p.Set(1 if value else 0)
-                    t.Commit()
+                            set_yesno_param(p, value)
                     debug(" -> Reducer fixed.")
-                    updated += 1
+                    fit_updated += 1
                     reducer_fixed = True
 
                 # 2. Turn OFF 2x45°
-                p_bend = elem.LookupParameter("2x45°")
+                p_bend = lookup_fitting_param(elem, "2x45°")
                 if p_bend and p_bend.StorageType == StorageType.Integer:
                     if p_bend.AsInteger() == 1:
                         debug(" -> Turning OFF 2x45°")
-                        t = Transaction(doc, "Turn off 2x45°")
-                        t.Start()
                         p_bend.Set(0)
-                        t.Commit()
-                        updated += 1
+                        fit_updated += 1
                     elif not reducer_fixed:
                         debug(" -> 2x45° already OFF")
-                        skipped += 1
+                        fit_skipped += 1
                 elif not reducer_fixed:
-                    skipped += 1
+                    fit_skipped += 1
 
                 # Auto toggle 2x45 degree for elbows based on vertical pipe diameter
                 if isinstance(elem, FamilyInstance):
-                    fam_name = elem.Symbol.Family.Name.lower()
-                    if "bocht_sh_geb" in fam_name or "bocht" in fam_name:
-                        connector_mgr = elem.MEPModel.ConnectorManager
+                    fam_flags = get_family_flags(elem)
+                    # "bocht" also covers bocht_sh_geb and multibocht families
+                    if "bocht" in fam_flags:
+                        links = get_vertical_connections(elem)
                         vertical_diam = None
-
-                        for conn in connector_mgr.Connectors:
-                            dir = conn.CoordinateSystem.BasisZ
-                            if abs(dir.Z) > 0.9:
-                                try:
-                                    connected = list(conn.AllRefs)
-                                    for ref in connected:
-                                        if ref.Owner.Id != elem.Id and hasattr(
-                                            ref.Owner, "LookupParameter"
-                                        ):
-                                            pipe = ref.Owner
-                                            diam_param = pipe.LookupParameter(
-                                                "Outside Diameter"
-                                            ) or pipe.LookupParameter("Diameter")
-                                            if diam_param:
-                                                d_mm = diam_param.AsDouble() * 304.8
-                                                vertical_diam = d_mm
-                                                break
-                                except Exception as ex:
-                                    debug(
-                                        "⚠️ Failed to resolve vertical pipe diameter:",
-                                        ex,
-                                    )
-
-                        if vertical_diam is not None:
-                            try:
-                                bend_param = elem.LookupParameter("2x45°")
+                        # owners already inspected; last_oid catches the common
+                        # case of the same owner being reported back to back
+                        visited = set()
+                        last_oid = -1
+
+                        for basis_z, owners in links:
+                            for oid_int, owner in owners:
+                                if oid_int == last_oid or oid_int in visited:
+                                    continue
+                                last_oid = oid_int
+                                visited.add(oid_int)
+                                diam_param = owner.LookupParameter(
+                                    "Outside Diameter"
+                                ) or owner.LookupParameter("Diameter")
                                 if (
-                                    bend_param
-                                    and bend_param.StorageType == StorageType.Integer
+                                    diam_param
+                                    and diam_param.StorageType == StorageType.Double
                                 ):
-                                    t = Transaction(doc, "Set 2x45° for elbow")
-                                    t.Start()
-                                    if vertical_diam > 100:
-                                        bend_param.Set(1)
-                                        debug(
-                                            "✅ 2x45° turned ON for:",
-                                            elem.Id,
-                                            "| Ø =",
-                                            vertical_diam,
-                                        )
-                                    else:
-                                        bend_param.Set(0)
-                                        debug(
-                                            "✅ 2x45° turned OFF for:",
-                                            elem.Id,
-                                            "| Ø =",
-                                            vertical_diam,
-                                        )
-                                    t.Commit()
-                                    updated += 1
-                            except Exception as ex:
-                                debug("❌ Failed to set 2x45° on elbow:", ex)
+                                    # internal units (feet)
+                                    vertical_diam = diam_param.AsDouble()
+                                    break
 
-                    # Auto toggle reducer_eccentric for multireducer going UP
-                    elif "multireducer_geb" in fam_name:
-                        try:
-                            connector_mgr = elem.MEPModel.ConnectorManager
-                            is_vertical_up = False
-
-                            for conn in connector_mgr.Connectors:
-                                dir = conn.CoordinateSystem.BasisZ
-                                if abs(dir.Z) > 0.9:
-                                    connected = list(conn.AllRefs)
-                                    for ref in connected:
-                                        if ref.Owner.Id != elem.Id:
-                                            # Check if the direction is upward
-                                            vec = conn.CoordinateSystem.BasisZ
-                                            if vec.Z > 0.9:
-                                                is_vertical_up = True
-                                                break
-                                    if is_vertical_up:
-                                        break
-
-                            if is_vertical_up:
-                                reducer_param = elem.LookupParameter(
-                                    "reducer_eccentric"
-                                )
-                                if reducer_param and reducer_param.AsInteger() == 1:
-                                    t = Transaction(doc, "Auto-Fix Reducer Eccentric")
-                                    t.Start()
-                                    reducer_param.Set(0)
-                                    t.Commit()
+                        if vertical_diam is not None:
+                            bend_param = lookup_fitting_param(elem, "2x45°")
+                            if (
+                                bend_param
+                                and bend_param.StorageType == StorageType.Integer
+                            ):
+                                new_val = int(vertical_diam > ELBOW_2X45_MIN_DIAM)
+                                if set_yesno_param(bend_param, new_val):
                                     debug(
-                                        "✅ Turned OFF reducer_eccentric for vertical-up multireducer:",
+                                        "✅ 2x45° turned",
+                                        "ON" if new_val == 1 else "OFF",
+                                        "for:",
                                         elem.Id,
+                                        "| Ø =",
+                                        vertical_diam * 304.8,
                                     )
-                                    updated += 1
-                        except Exception as ex:
-                            debug("❌ Failed to auto-toggle reducer_eccentric:", ex)
+                                fit_updated += 1
+
+                    # Auto toggle reducer_eccentric for multireducer going UP
+                    elif "multireducer_geb" in fam_flags and is_connected_upward(elem):
+                        reducer_param = lookup_fitting_param(elem, "reducer_eccentric")
+                        if (
+                            reducer_param
+                            and reducer_param.StorageType == StorageType.Integer
+                            and reducer_param.AsInteger() == 1
+                        ):
+                            reducer_param.Set(0)
+                            debug(
+                                "✅ Turned OFF reducer_eccentric for vertical-up multireducer:",
+                                elem.Id,
+                            )
+                            fit_updated += 1
 
+                st.Commit()
+                updated += fit_updated
+                skipped += fit_skipped
             except Exception as ex:
+                if st.HasStarted() and not st.HasEnded():
+                    st.RollBack()
                 debug("Exception while processing:", ex)
                 skipped += 1
 
+            batched += 1
+            if batched % FIX_BATCH_SIZE == 0:
+                t.Commit()
+                t = Transaction(doc, "AutoFix Reducers")
+                t.Start()
+
+        t.Commit()
+        tg.Assimilate()
+
         return updated, skipped
 
     def btnFixReducers_Click(self, sender, event):
 
-        updated, skipped = self.auto_fix_inline()
+        counts = self.auto_fix_inline()
+        if counts is None:
+            MessageBox.Show("No pipe fittings in the list.", "Fix Reducers")
+            return
+        updated, skipped = counts
 
-        for row in self.dataGrid.Rows:
-            cat = row.Cells["Category"].Value
-            if cat != "Pipe Fittings":
+        for row in self.rows_data:
+            if row["Category"] != "Pipe Fittings":
                 continue
 
             try:
-                eid = int(str(row.Cells["Id"].Value))
-                elem = doc.GetElement(ElementId(eid))
+                eid = int(str(row["Id"]))
+                elem = self._get_elem(eid)
                 if not elem:
                     continue
 
-                name = row.Cells["Name"].Value
-                tag_status = row.Cells["TagStatus"].Value
+                name = row["Name"]
+                tag_status = row["TagStatus"]
 
                 # Flip 2x45° logic (manual logic reused)
                 if tag_status == "Flip 2x45°":
@@ -809,7 +1268,7 @@ class ElementEditorForm(Form):
                 if "multireducer_geb" in name_lc and "var. dn/od" in name_lc:
                     try:
                         is_vertical = False
-                        if hasattr(elem, "HandOrientation"):
+                        if isinstance(elem, FamilyInstance):
                             dir = elem.HandOrientation
                             debug("Orientation vector (HandOrientation):", dir)
                             if abs(dir.Z) > 0.9:
@@ -846,15 +1305,14 @@ class ElementEditorForm(Form):
 
                 # Re-read parameters from Revit
                 p_warn = elem.LookupParameter("waarschuwing")
-                warning_val = p_warn.AsString() if p_warn else ""
-                row.Cells["Warning"].Value = warning_val
+                row["Warning"] = p_warn.AsString() if p_warn else ""
 
                 p_bend = elem.LookupParameter("2x45°")
                 if p_bend and p_bend.StorageType == StorageType.Integer:
-                    bend45_val = "Yes" if p_bend.AsInteger() == 1 else "No"
-                    row.Cells["Bend45"].Value = bend45_val
+                    row["Bend45"] = "Yes" if p_bend.AsInteger() == 1 else "No"
             except:
                 continue
+        self.dataGrid.Invalidate()
 
         MessageBox.Show(
             "✅ Reducers Fixed!\n\nUpdated: {}\nSkipped: {}".format(updated, skipped),
@@ -872,100 +1330,88 @@ class ElementEditorForm(Form):
             self.txtTextNoteCode.ForeColor = Color.Gray
 
     def bulkAddRemoveTags_Click(self, sender, event):
-        rows_to_process = []
-        for row in self.dataGrid.Rows:
-            cat = row.Cells["Category"].Value
-            if cat == "Pipes":
-                rows_to_process.append(row)
-
-        for row in rows_to_process:
-            val = row.Cells["TagStatus"].Value
-            host_id = int(str(row.Cells["Id"].Value))
-            host = doc.GetElement(ElementId(host_id))
-
-            if val == "Add/Place Tag":
-                tr = Transaction(doc, "Add Tag")
-                tr.Start()
-                bb = host.get_BoundingBox(uidoc.ActiveView)
-                if bb:
-                    ctr = XYZ(
-                        (bb.Min.X + bb.Max.X) / 2.0,
-                        (bb.Min.Y + bb.Max.Y) / 2.0,
-                        (bb.Min.Z + bb.Max.Z) / 2.0,
-                    )
+        # work on the backing dicts; they stay valid while tag rows are
+        # appended/removed, and reading them never unshares a grid row
+        rows_to_process = [d for d in self.rows_data if d["Category"] == "Pipes"]
+
+        view_id = uidoc.ActiveView.Id
+        tag_index = self._get_tag_index()
+
+        # the document is changed first; rows, tag index and grid are only
+        # updated once the transaction has committed
+        added = []  # (pipe row, host id, new tag id, tag row dict)
+        removed = []  # (pipe row, host id, tag id)
+
+        # all adds/removes go into one transaction instead of one per pipe
+        tr = Transaction(doc, "Add/Remove Tags")
+        tr.Start()
+        try:
+            for row in rows_to_process:
+                val = row["TagStatus"]
+                host_id = int(str(row["Id"]))
+
+                if val == "Add/Place Tag":
+                    host = self._get_elem(host_id)
+                    ctr = get_bbox_center(host)
+                    if not ctr:
+                        continue
                     ref = Reference(host)
                     new_tag = IndependentTag.Create(
                         doc,
-                        doc.ActiveView.Id,
+                        view_id,
                         ref,
                         True,
-                        TagMode.TM_ADDBY_CATEGORY,
-                        TagOrientation.Horizontal,
+                        TAG_MODE,
+                        TAG_ORIENTATION,
                         ctr,
                     )
-                tr.Commit()
-                row.Cells["TagStatus"].Value = "Remove Tag"
-                te = doc.GetElement(new_tag.Id)
-                if te:
+                    if new_tag is None:
+                        continue
                     data = {
-                        "Id": str(te.Id),
+                        "Id": str(new_tag.Id),
                         "Category": "Pipe Tags",
-                        "Name": te.Name or "",
-                        "DefaultCode": host.LookupParameter("Comments").AsString()
+                        "Name": new_tag.Name or "",
+                        "DefaultCode": host.get_Parameter(COMMENTS_BIP).AsString()
                         or "",
-                        "NewCode": row.Cells["NewCode"].Value,
-                        "OutsideDiameter": row.Cells["OutsideDiameter"].Value,
-                        "Length": row.Cells["Length"].Value,
+                        "NewCode": row["NewCode"],
+                        "OutsideDiameter": row["OutsideDiameter"],
+                        "Length": row["Length"],
                         "Size": "",
                         "GEB_Article_Number": "",
                         "TagStatus": "Yes",
                     }
-                    self._add_row(data)
-
-            elif val == "Remove Tag":
-                host_eid = host.Id.IntegerValue
-                deleted_id = None
-                tag_elem_id = None
-                for t in (
-                    FilteredElementCollector(doc)
-                    .OfCategory(BuiltInCategory.OST_PipeTags)
-                    .WhereElementIsNotElementType()
-                    .ToElements()
-                ):
-                    tagged = (
-                        t.GetTaggedElementIds()
-                        if hasattr(t, "GetTaggedElementIds")
-                        else [t.TaggedElementId]
-                    )
-                    for rid in tagged:
-                        eid = (
-                            rid.HostElementId.IntegerValue
-                            if hasattr(rid, "HostElementId")
-                            else rid.IntegerValue
-                        )
-                        if eid == host_eid:
-                            deleted_id = t.Id.IntegerValue
-                            tag_elem_id = t.Id
-                            break
-                    if deleted_id:
-                        break
-                if deleted_id:
-                    self.dataGrid.SelectionChanged -= self.on_row_selected
-                    tr = Transaction(doc, "Remove Tag")
-                    tr.Start()
-                    doc.Delete(tag_elem_id)
-                    tr.Commit()
-                    row.Cells["TagStatus"].Value = "Add/Place Tag"
-                    row.Cells["TagStatus"].ReadOnly = False
-                    for i in range(self.dataGrid.Rows.Count):
-                        r2 = self.dataGrid.Rows[i]
-                        if (
-                            r2.Cells["Category"].Value == "Pipe Tags"
-                            and int(str(r2.Cells["Id"].Value)) == deleted_id
-                        ):
-                            self.dataGrid.Rows.RemoveAt(i)
-                            break
-                    self.dataGrid.SelectionChanged += self.on_row_selected
+                    added.append((row, host_id, new_tag.Id, data))
+
+                elif val == "Remove Tag":
+                    tag_elem_id = tag_index.get(host_id)
+                    if tag_elem_id is not None:
+                        removed.append((row, host_id, tag_elem_id))
+
+            if removed:
+                # typed array -> List in one copy, then a single Delete call
+                doc.Delete(List[ElementId](Array[ElementId]([r[2] for r in removed])))
+            tr.Commit()
+        except Exception as ex:
+            if tr.HasStarted() and not tr.HasEnded():
+                tr.RollBack()
+            MessageBox.Show("Failed to add/remove tags:\n\n{}".format(ex), "Error")
+            return
+
+        for row, host_id, tag_id, data in added:
+            tag_index[host_id] = tag_id
+            row["TagStatus"] = "Remove Tag"
+            self._add_row(data)
+
+        if removed:
+            self.dataGrid.SelectionChanged -= self.on_row_selected
+            for row, host_id, tag_id in removed:
+                tag_index.pop(host_id, None)
+                row["TagStatus"] = "Add/Place Tag"
+                i = self._find_row("Pipe Tags", tag_id.IntegerValue)
+                if i is not None:
+                    self._remove_row(i)
+            self.dataGrid.SelectionChanged += self.on_row_selected
+        self.dataGrid.Invalidate()
 
     # Smart dynamic spacing
     def rearrange_buttons(self, sender, event):
@@ -979,41 +1425,42 @@ class ElementEditorForm(Form):
             x += ctrl.Width + spacing
 
     def _add_row(self, data):
-        """Helper to append a new DataGridView row from a dict."""
-        idx = self.dataGrid.Rows.Add()
-        row = self.dataGrid.Rows[idx]
-        for k, v in data.items():
-            row.Cells[k].Value = v
+        """Helper to append a new row to rows_data and the grid."""
+        data = dict(data)
 
-        # Start with default
-        row.Cells["TagStatus"].Value = "Remove Tag"
-        row.Cells["TagStatus"].ReadOnly = True
+        # Start with default; a new tag row keeps a working Remove Tag button,
+        # only fittings without a flip action are locked
+        cat = data.get("Category", "")
+        data["TagStatus"] = "Remove Tag"
+        data["TagStatusReadOnly"] = cat == "Pipe Fittings"
 
         # Try to identify reducer buttons
         try:
-            cat = data.get("Category", "")
             eid = int(data.get("Id", "0"))
-            elem = doc.GetElement(ElementId(eid))
+            elem = self._get_elem(eid)
 
             if cat == "Pipe Fittings" and isinstance(elem, FamilyInstance):
-                fam_name = elem.Symbol.Family.Name.lower()
-                debug("✅ Family name:", fam_name)
+                fam_flags = get_family_flags(elem)
+                debug("✅ Family name:", get_family_name_lc(elem))
 
-                if "multireducer_geb" in fam_name:
-                    row.Cells["TagStatus"].Value = "Flip Reducer"
-                    row.Cells["TagStatus"].ReadOnly = False
+                if "multireducer_geb" in fam_flags:
+                    data["TagStatus"] = "Flip Reducer"
+                    data["TagStatusReadOnly"] = False
 
-                elif "multibocht" in fam_name:
-                    row.Cells["TagStatus"].Value = "Flip 2x45°"
-                    row.Cells["TagStatus"].ReadOnly = False
+                elif "multibocht" in fam_flags:
+                    data["TagStatus"] = "Flip 2x45°"
+                    data["TagStatusReadOnly"] = False
 
-                elif "liggend" in fam_name:
-                    row.Cells["TagStatus"].Value = "Flip T-stuk"
-                    row.Cells["TagStatus"].ReadOnly = False
+                elif "liggend" in fam_flags:
+                    data["TagStatus"] = "Flip T-stuk"
+                    data["TagStatusReadOnly"] = False
 
         except Exception as ex:
             debug("⚠️ Error resolving Flip button logic:", ex)
 
+        self.rows_data.append(data)
+        self.dataGrid.RowCount = len(self.rows_data)
+
     def btnPlaceTextNote_Click(self, sender, event):
         text_note_code = self.txtTextNoteCode.Text.strip()
         if text_note_code == "":
@@ -1028,7 +1475,7 @@ class ElementEditorForm(Form):
         corner = region_min
         ttn = Transaction(doc, "Place Text Note")
         ttn.Start()
-        note_type = FilteredElementCollector(doc).OfClass(TextNoteType).FirstElement()
+        note_type = get_default_text_note_type()
         if note_type:
             opts = TextNoteOptions(note_type.Id)
             new_note = TextNote.Create(
@@ -1044,7 +1491,7 @@ class ElementEditorForm(Form):
     def autoFillPipeTagCodes(self, sender, event):
         # 1) Parse base
         raw = self.txtTextNoteCode.Text.strip()
-        m = re.search(r"([\d\.]+)", raw)
+        m = _BASE_RE.search(raw)
         if not m:
             MessageBox.Show("Could not parse base code from text note.", "Error")
             return
@@ -1062,9 +1509,10 @@ class ElementEditorForm(Form):
             prefix, base_n = base, 0
 
         # 2) Collect indices
+        rows_data = self.rows_data
         fit_rows, pipe_rows, tag_rows = [], [], []
-        for i in range(self.dataGrid.Rows.Count):
-            cat = self.dataGrid.Rows[i].Cells["Category"].Value
+        for i, data in enumerate(rows_data):
+            cat = data["Category"]
             if cat == "Pipe Fittings":
                 fit_rows.append(i)
             elif cat == "Pipes":
@@ -1074,57 +1522,77 @@ class ElementEditorForm(Form):
 
         # Override all Pipe Fittings rows to the base code
         for idx in fit_rows:
-            self.dataGrid.Rows[idx].Cells["NewCode"].Value = base
+            rows_data[idx]["NewCode"] = base
 
         # 5) Pipes sorted and numbered: full base + .1,.2...
-        pipe_centers = []
+        origin_key = pack_plan_key(0.0, 0.0)
+        keys = []
         for idx in pipe_rows:
-            rid = int(str(self.dataGrid.Rows[idx].Cells["Id"].Value))
-            elem = doc.GetElement(ElementId(rid))
-            bbox = elem.get_BoundingBox(uidoc.ActiveView)
-            if bbox:
-                ctr = XYZ(
-                    (bbox.Min.X + bbox.Max.X) * 0.5,
-                    (bbox.Min.Y + bbox.Max.Y) * 0.5,
-                    (bbox.Min.Z + bbox.Max.Z) * 0.5,
-                )
-            else:
-                ctr = XYZ(0, 0, 0)
-            pipe_centers.append((idx, ctr))
+            rid = int(str(rows_data[idx]["Id"]))
+            key = get_plan_sort_key(self._get_elem(rid))
+            keys.append(origin_key if key is None else key)
 
-        pipe_centers.sort(key=lambda x: (x[1].X, x[1].Y))
-        for i, (idx, _) in enumerate(pipe_centers, 1):
-            self.dataGrid.Rows[idx].Cells["NewCode"].Value = "{}.{}".format(base, i)
+        # stable sort: pipes at the same spot keep their row order
+        pipe_order = [
+            pipe_rows[k] for k in sorted(range(len(keys)), key=keys.__getitem__)
+        ]
+        for i, idx in enumerate(pipe_order, 1):
+            rows_data[idx]["NewCode"] = "{}.{}".format(base, i)
 
         # 6) Mirror pipe numbering onto pipe‐tag rows (same count)
-        for i, _ in enumerate(pipe_centers, 1):
+        for i, _ in enumerate(pipe_order, 1):
             if i - 1 < len(tag_rows):
                 trow = tag_rows[i - 1]
-                self.dataGrid.Rows[trow].Cells["NewCode"].Value = "{}.{}".format(
-                    base, i
-                )
+                rows_data[trow]["NewCode"] = "{}.{}".format(base, i)
+
+        self.dataGrid.Invalidate()
+
+    def _selected_row_indexes(self):
+        """Indexes of the selected rows, read from the row states so the
+        rows stay shared (SelectedRows would materialise each one)."""
+        selected = DataGridViewElementStates.Selected
+        rows = self.dataGrid.Rows
+        indexes = []
+        i = rows.GetFirstRow(selected)
+        while i >= 0:
+            indexes.append(i)
+            i = rows.GetNextRow(i, selected)
+        return indexes
+
+    def _index_of(self, data):
+        """Current index of a row dict in rows_data, or None."""
+        for i, d in enumerate(self.rows_data):
+            if d is data:
+                return i
+        return None
 
     def dataGrid_CellContentClick(self, sender, e):
         col = self.dataGrid.Columns[e.ColumnIndex].Name
-        if col != "TagStatus":
+        if col != "TagStatus" or self._tag_status_locked(e.RowIndex):
             return
 
         # Always include the clicked row
-        clicked_row = self.dataGrid.Rows[e.RowIndex]
-        selected_indexes = {r.Index for r in self.dataGrid.SelectedRows if r.Index >= 0}
-        selected_indexes.add(clicked_row.Index)
+        selected_indexes = set(self._selected_row_indexes())
+        selected_indexes.add(e.RowIndex)
 
-        # Build selected rows list from indexes
-        selected_rows = [self.dataGrid.Rows[i] for i in selected_indexes]
+        # Work on the row dicts: they stay valid while rows are added or
+        # removed below, where grid indexes would shift
+        selected_rows = [
+            self.rows_data[i]
+            for i in sorted(selected_indexes)
+            if i < len(self.rows_data)
+        ]
 
         for row in selected_rows:
-            cat = row.Cells["Category"].Value
-            val = row.Cells["TagStatus"].Value
+            if row.get("TagStatusReadOnly"):
+                continue
+            cat = row["Category"]
+            val = row["TagStatus"]
 
             if cat == "Pipe Fittings" and val == "Flip T-stuk":
                 try:
-                    host_id = int(str(row.Cells["Id"].Value))
-                    elem = doc.GetElement(ElementId(host_id))
+                    host_id = int(str(row["Id"]))
+                    elem = self._get_elem(host_id)
                     if elem:
                         p = elem.LookupParameter("switch_excentriciteit")
                         if p and p.StorageType == StorageType.Integer:
@@ -1142,8 +1610,8 @@ class ElementEditorForm(Form):
 
             elif cat == "Pipe Fittings" and val == "Flip 2x45°":
                 try:
-                    host_id = int(str(row.Cells["Id"].Value))
-                    elem = doc.GetElement(ElementId(host_id))
+                    host_id = int(str(row["Id"]))
+                    elem = self._get_elem(host_id)
                     if elem:
                         param = elem.LookupParameter("2x45°")
                         if param and param.StorageType == StorageType.Integer:
@@ -1154,10 +1622,7 @@ class ElementEditorForm(Form):
                             param.Set(0 if current_val == 1 else 1)
                             t.Commit()
 
-                            if current_val == 1:
-                                row.Cells["Bend45"].Value = "No"
-                            else:
-                                row.Cells["Bend45"].Value = "Yes"
+                            row["Bend45"] = "No" if current_val == 1 else "Yes"
 
                             debug(
                                 "✅ Toggled 2x45° to",
@@ -1176,14 +1641,11 @@ class ElementEditorForm(Form):
 
             elif cat == "Pipe Fittings" and val == "Flip Reducer":
                 try:
-                    host_id = int(str(row.Cells["Id"].Value))
-                    elem = doc.GetElement(ElementId(host_id))
+                    host_id = int(str(row["Id"]))
+                    elem = self._get_elem(host_id)
 
                     if elem and isinstance(elem, FamilyInstance):
-                        name = row.Cells["Name"].Value or ""
-                        family_name = elem.Symbol.Family.Name.lower()
-
-                        if "multireducer_geb" in family_name:
+                        if "multireducer_geb" in get_family_flags(elem):
                             reducer_param = elem.LookupParameter("reducer_eccentric")
                             if (
                                 reducer_param
@@ -1209,45 +1671,40 @@ class ElementEditorForm(Form):
             # ADD/REMOVE TAG (Pipes)
             # ----------------------
             elif cat == "Pipes":
-                host_id = int(str(row.Cells["Id"].Value))
-                host = doc.GetElement(ElementId(host_id))
+                host_id = int(str(row["Id"]))
+                host = self._get_elem(host_id)
 
                 if val == "Add/Place Tag":
+                    new_tag = None
                     tr = Transaction(doc, "Add Tag")
                     tr.Start()
-                    bb = host.get_BoundingBox(uidoc.ActiveView)
-                    if bb:
-                        ctr = XYZ(
-                            (bb.Min.X + bb.Max.X) / 2.0,
-                            (bb.Min.Y + bb.Max.Y) / 2.0,
-                            (bb.Min.Z + bb.Max.Z) / 2.0,
-                        )
+                    ctr = get_bbox_center(host)
+                    if ctr:
                         ref = Reference(host)
                         new_tag = IndependentTag.Create(
                             doc,
                             doc.ActiveView.Id,
                             ref,
                             True,
-                            TagMode.TM_ADDBY_CATEGORY,
-                            TagOrientation.Horizontal,
+                            TAG_MODE,
+                            TAG_ORIENTATION,
                             ctr,
                         )
                     tr.Commit()
 
-                    row.Cells["TagStatus"].Value = "Remove Tag"
-
                     # Add new Pipe Tag row
-                    te = doc.GetElement(new_tag.Id)
-                    if te:
+                    if new_tag:
+                        row["TagStatus"] = "Remove Tag"
+                        self._get_tag_index()[host_id] = new_tag.Id
                         data = {
-                            "Id": str(te.Id),
+                            "Id": str(new_tag.Id),
                             "Category": "Pipe Tags",
-                            "Name": te.Name or "",
-                            "DefaultCode": host.LookupParameter("Comments").AsString()
+                            "Name": new_tag.Name or "",
+                            "DefaultCode": host.get_Parameter(COMMENTS_BIP).AsString()
                             or "",
-                            "NewCode": row.Cells["NewCode"].Value,
-                            "OutsideDiameter": row.Cells["OutsideDiameter"].Value,
-                            "Length": row.Cells["Length"].Value,
+                            "NewCode": row["NewCode"],
+                            "OutsideDiameter": row["OutsideDiameter"],
+                            "Length": row["Length"],
                             "Size": "",
                             "GEB_Article_Number": "",
                             "TagStatus": "Yes",
@@ -1255,110 +1712,70 @@ class ElementEditorForm(Form):
                         self._add_row(data)
 
                 elif val == "Remove Tag":
-                    host_eid = host.Id.IntegerValue
-                    deleted_id = None
-                    tag_elem_id = None
-                    for t in (
-                        FilteredElementCollector(doc)
-                        .OfCategory(BuiltInCategory.OST_PipeTags)
-                        .WhereElementIsNotElementType()
-                        .ToElements()
-                    ):
-                        tagged = (
-                            t.GetTaggedElementIds()
-                            if hasattr(t, "GetTaggedElementIds")
-                            else [t.TaggedElementId]
-                        )
-                        for rid in tagged:
-                            eid = (
-                                rid.HostElementId.IntegerValue
-                                if hasattr(rid, "HostElementId")
-                                else rid.IntegerValue
-                            )
-                            if eid == host_eid:
-                                deleted_id = t.Id.IntegerValue
-                                tag_elem_id = t.Id
-                                break
-                        if deleted_id:
-                            break
-                    if deleted_id:
+                    tag_index = self._get_tag_index()
+                    tag_elem_id = tag_index.get(host_id)
+                    if tag_elem_id is not None:
                         self.dataGrid.SelectionChanged -= self.on_row_selected
-                        tr = Transaction(doc, "Remove Tag")
-                        tr.Start()
-                        doc.Delete(tag_elem_id)
-                        tr.Commit()
-                        row.Cells["TagStatus"].Value = "Add/Place Tag"
-                        row.Cells["TagStatus"].ReadOnly = False
-                        for i in range(self.dataGrid.Rows.Count):
-                            r2 = self.dataGrid.Rows[i]
-                            if (
-                                r2.Cells["Category"].Value == "Pipe Tags"
-                                and int(str(r2.Cells["Id"].Value)) == deleted_id
-                            ):
-                                self.dataGrid.Rows.RemoveAt(i)
-                                break
-                        self.dataGrid.SelectionChanged += self.on_row_selected
+                        try:
+                            tr = Transaction(doc, "Remove Tag")
+                            tr.Start()
+                            doc.Delete(tag_elem_id)
+                            tr.Commit()
+                            del tag_index[host_id]
+                            row["TagStatus"] = "Add/Place Tag"
+                            row["TagStatusReadOnly"] = False
+                            i = self._find_row("Pipe Tags", tag_elem_id.IntegerValue)
+                            if i is not None:
+                                self._remove_row(i)
+                        finally:
+                            self.dataGrid.SelectionChanged += self.on_row_selected
 
             # --------------------------
             # REMOVE TAG (Pipe Tags)
             # --------------------------
             elif cat == "Pipe Tags" and val == "Remove Tag":
-                tag_id = ElementId(int(str(row.Cells["Id"].Value)))
+                tag_id_int = int(str(row["Id"]))
+                tag_id = ElementId(tag_id_int)
                 self.dataGrid.SelectionChanged -= self.on_row_selected
                 try:
                     tag_elem = doc.GetElement(tag_id)
                     host_id = None
                     if tag_elem:
-                        ids = (
-                            tag_elem.GetTaggedElementIds()
-                            if hasattr(tag_elem, "GetTaggedElementIds")
-                            else [tag_elem.TaggedElementId]
-                        )
-                        if ids and len(ids):
-                            rid = ids[0]
-                            host_id = (
-                                rid.HostElementId.IntegerValue
-                                if hasattr(rid, "HostElementId")
-                                else rid.IntegerValue
-                            )
+                        host_ids = tag_host_ids(tag_elem)
+                        if host_ids:
+                            host_id = host_ids[0]
 
                     tr = Transaction(doc, "Remove Pipe-Tag")
                     tr.Start()
                     doc.Delete(tag_id)
                     tr.Commit()
 
-                    self.dataGrid.Rows.RemoveAt(row.Index)
+                    i = self._index_of(row)
+                    if i is not None:
+                        self._remove_row(i)
 
                     if host_id:
-                        for i in range(self.dataGrid.Rows.Count):
-                            pr = self.dataGrid.Rows[i]
-                            if (
-                                int(str(pr.Cells["Id"].Value)) == host_id
-                                and pr.Cells["Category"].Value == "Pipes"
-                            ):
-                                pr.Cells["TagStatus"].Value = "Add/Place Tag"
-                                pr.Cells["TagStatus"].ReadOnly = False
-                                break
+                        tag_index = self._get_tag_index()
+                        indexed = tag_index.get(host_id)
+                        if indexed is not None and indexed.IntegerValue == tag_id_int:
+                            del tag_index[host_id]
+                        i = self._find_row("Pipes", host_id)
+                        if i is not None:
+                            self.rows_data[i]["TagStatus"] = "Add/Place Tag"
+                            self.rows_data[i]["TagStatusReadOnly"] = False
                 finally:
                     self.dataGrid.SelectionChanged += self.on_row_selected
 
-    def okButton_Click(self, sender, event):
-        updated_data = []
-        for row in self.dataGrid.Rows:
-            entry = {
-                "Id": row.Cells["Id"].Value,
-                "Category": row.Cells["Category"].Value,
-                "Name": row.Cells["Name"].Value,
-                "DefaultCode": row.Cells["DefaultCode"].Value,
-                "NewCode": row.Cells["NewCode"].Value,
-                "OutsideDiameter": row.Cells["OutsideDiameter"].Value,
-                "Length": row.Cells["Length"].Value,
-                "TagStatus": row.Cells["TagStatus"].Value,
-            }
-            updated_data.append(entry)
+        # values changed in the dicts above; repaint what is visible
+        self.dataGrid.Invalidate()
 
+    def okButton_Click(self, sender, event):
+        # End any pending edit so the last typed NewCode reaches rows_data.
+        # Edits are written into rows_data as they happen (CellValuePushed),
+        # so the backing list is handed over as-is instead of being copied.
+        self.dataGrid.EndEdit()
         self.Result = {
-            "Elements": updated_data,
+            "Elements": self.rows_data,
             "TextNotePlaced": self.textNotePlaced,
             "TextNote": self.txtTextNoteCode.Text.strip(),
         }
@@ -1367,10 +1784,12 @@ class ElementEditorForm(Form):
 
     def on_row_selected(self, sender, event):
         """When the user clicks or arrows to a row, select that element in Revit."""
-        row = self.dataGrid.CurrentRow
-        if not row:
+        # the current cell's row index, read without touching CurrentRow so
+        # the row stays shared
+        index = self.dataGrid.CurrentCellAddress.Y
+        if index < 0 or index >= len(self.rows_data):
             return
-        id_val = row.Cells["Id"].Value
+        id_val = self.rows_data[index]["Id"]
         if not id_val:
             return
 
@@ -1385,8 +1804,8 @@ class ElementEditorForm(Form):
             return
 
 
-def show_element_editor(elements_data, region_elements=None):
-    form = ElementEditorForm(elements_data, region_elements)
+def show_element_editor(elements_data, region_elements=None, tag_by_host=None):
+    form = ElementEditorForm(elements_data, region_elements, tag_by_host)
     if form.ShowDialog() == DialogResult.OK:
         return form.Result
     return None
@@ -1395,67 +1814,78 @@ def show_element_editor(elements_data, region_elements=None):
 # ==================================================
 # Filter Gathered Elements to Relevant Categories
 # ==================================================
-def filter_relevant_elements(gathered_elements):
+def filter_relevant_elements(gathered_elements, tag_by_host):
     """
     Build a list of dicts with keys:
      "Id","Category","Name","DefaultCode","NewCode",
      "OutsideDiameter","Length","GEB_Article_Number","TagStatus"
+
+    tag_by_host is the map from build_tag_host_map().
     """
     relevant = []
 
-    pipe_ids = {
-        e.Id.IntegerValue
-        for e in gathered_elements
-        if e.Category and e.Category.Name == "Pipes"
-    }
-    # grab all tags in the view
-    all_pipe_tags = (
-        FilteredElementCollector(doc)
-        .OfCategory(BuiltInCategory.OST_PipeTags)
-        .WhereElementIsNotElementType()
-        .ToElements()
-    )
+    region_pipes = [
+        e for e in gathered_elements if e.Category and e.Category.Name == "Pipes"
+    ]
+    # Comments / Outside Diameter / Length per pipe, looked up once even when
+    # the pipe is reached again as the host of one or more tags
+    host_param_cache = {}
+
+    def host_params(host_id, host):
+        params = host_param_cache.get(host_id)
+        if params is None:
+            params = get_params(host, PIPE_PARAMS)
+            host_param_cache[host_id] = params
+        return params
+
+    # formatted "Outside Diameter" / "Length" strings per (pipe, param name)
+    host_str_cache = {}
+
+    def host_str(host_id, host, pname):
+        key = (host_id, pname)
+        val = host_str_cache.get(key)
+        if val is None:
+            val = convert_param_to_string(host_params(host_id, host)[pname])
+            host_str_cache[key] = val
+        return val
+
+    # ids of every element that carries at least one pipe tag
+    tagged_hosts = frozenset(tag_by_host)
 
     # pull in any tags whose host pipe was in our region
-    for tag in all_pipe_tags:
-        try:
-            host = None
-            if hasattr(tag, "GetTaggedElementIds"):
-                ids = tag.GetTaggedElementIds()
-                if ids and ids.Count > 0:
-                    host = doc.GetElement(ids[0])
-            elif hasattr(tag, "TaggedElementId"):
-                host = doc.GetElement(tag.TaggedElementId)
-            if host and host.Id.IntegerValue in pipe_ids:
-                # and only if we haven't already added it in gathered_elements
-                if not any(str(tag.Id) == d["Id"] for d in relevant):
-                    warning_val = ""
-                    bend45_val = ""
-                    # build your dict exactly like you do for pipe‑tags below
-                    relevant.append(
-                        {
-                            "Id": str(tag.Id),
-                            "Category": "Pipe Tags",
-                            "Name": tag.Name or "",
-                            "Warning": "",
-                            "Bend45": "",
-                            "DefaultCode": host.LookupParameter("Comments").AsString()
-                            or "",
-                            "NewCode": host.LookupParameter("Comments").AsString()
-                            or "",
-                            "OutsideDiameter": convert_param_to_string(
-                                host.LookupParameter("Outside Diameter")
-                            ),
-                            "Length": convert_param_to_string(
-                                host.LookupParameter("Length")
-                            ),
-                            "Size": "",  # if you want
-                            "GEB_Article_Number": "",
-                            "TagStatus": "Yes",
-                        }
-                    )
-        except:
-            pass
+    added_tag_ids = set()
+    for host in region_pipes:
+        host_id = host.Id.IntegerValue
+        if host_id not in tagged_hosts:
+            continue
+        for tag in tag_by_host[host_id]:
+            # and only if we haven't already added it in gathered_elements
+            tag_id_str = str(tag.Id)
+            if tag_id_str in added_tag_ids:
+                continue
+            added_tag_ids.add(tag_id_str)
+            try:
+                hp = host_params(host_id, host)
+                host_code = hp["Comments"].AsString() or ""
+                # build your dict exactly like you do for pipe‑tags below
+                relevant.append(
+                    {
+                        "Id": tag_id_str,
+                        "Category": "Pipe Tags",
+                        "Name": tag.Name or "",
+                        "Warning": "",
+                        "Bend45": "",
+                        "DefaultCode": host_code,
+                        "NewCode": host_code,
+                        "OutsideDiameter": host_str(host_id, host, "Outside Diameter"),
+                        "Length": host_str(host_id, host, "Length"),
+                        "Size": "",  # if you want
+                        "GEB_Article_Number": "",
+                        "TagStatus": "Yes",
+                    }
+                )
+            except:
+                pass
 
     for e in gathered_elements:
         if not e.Category:
@@ -1463,8 +1893,13 @@ def filter_relevant_elements(gathered_elements):
         cat = e.Category.Name
         if cat not in ("Pipes", "Pipe Fittings", "Pipe Tags", "Text Notes"):
             continue
+        # read once; the pipe branch uses it for both caches and the tag check
+        e_id = e.Id.IntegerValue
 
-        com = e.LookupParameter("Comments")
+        if cat == "Pipes":
+            com = host_params(e_id, e)["Comments"]
+        else:
+            com = e.get_Parameter(COMMENTS_BIP)
         default_code = com.AsString() if com and com.AsString() else ""
 
         # initialize
@@ -1478,28 +1913,11 @@ def filter_relevant_elements(gathered_elements):
 
         # --- Pipes ---
         if cat == "Pipes":
-            odp = e.LookupParameter("Outside Diameter")
-            lp = e.LookupParameter("Length")
-            outside_diam = convert_param_to_string(odp)
-            length_val = convert_param_to_string(lp)
+            outside_diam = host_str(e_id, e, "Outside Diameter")
+            length_val = host_str(e_id, e, "Length")
 
             # detect existing tags
-            tag_status = "No"
-            for tag in all_pipe_tags:
-                try:
-                    tagged_ids = []
-                    if hasattr(tag, "GetTaggedElementIds"):
-                        tagged_ids = tag.GetTaggedElementIds()
-                    elif hasattr(tag, "TaggedElementId"):
-                        tagged_ids = [tag.TaggedElementId]
-                    for tid in tagged_ids:
-                        if tid and tid.IntegerValue == e.Id.IntegerValue:
-                            tag_status = "Yes"
-                            break
-                    if tag_status == "Yes":
-                        break
-                except:
-                    pass
+            tag_status = "Yes" if e_id in tagged_hosts else "No"
 
         # --- Pipe Fittings ---
         elif cat == "Pipe Fittings":
@@ -1533,21 +1951,14 @@ def filter_relevant_elements(gathered_elements):
         elif cat == "Pipe Tags":
             tag_status = "Yes"
             host = None
-            try:
-                if hasattr(e, "GetTaggedElementIds"):
-                    ids = e.GetTaggedElementIds()
-                    if ids and ids.Count > 0:
-                        host = doc.GetElement(ids[0])
-                if not host and hasattr(e, "TaggedElementId"):
-                    host = doc.GetElement(e.TaggedElementId)
-            except:
-                host = None
+            host_ids = tag_host_ids(e)
+            if host_ids:
+                host_id = host_ids[0]
+                host = doc.GetElement(ElementId(host_id))
 
             if host:
-                odp = host.LookupParameter("Outside Diameter")
-                lp = host.LookupParameter("Length")
-                outside_diam = convert_param_to_string(odp)
-                length_val = convert_param_to_string(lp)
+                outside_diam = host_str(host_id, host, "Outside Diameter")
+                length_val = host_str(host_id, host, "Length")
 
         # --- Text Notes & others ---
         else:
@@ -1563,7 +1974,7 @@ def filter_relevant_elements(gathered_elements):
             {
                 "Id": str(e.Id),
                 "Category": cat,
-                "Name": e.Name if hasattr(e, "Name") else "",
+                "Name": e.Name or "",
                 "Warning": warning_val,
                 "Bend45": bend45_val,
                 "DefaultCode": default_code,
@@ -1587,17 +1998,26 @@ if gathered_elements is None or len(gathered_elements) == 0:
     MessageBox.Show("No elements were gathered. Operation cancelled.", "Error")
     sys.exit("Operation cancelled by the user.")
 
-filtered_elements = filter_relevant_elements(gathered_elements)
+# host -> tags, shared by the filter and the editor
+tag_by_host = build_tag_host_map(doc)
+
+filtered_elements = filter_relevant_elements(gathered_elements, tag_by_host)
 if len(filtered_elements) == 0:
     MessageBox.Show("No relevant elements found in the selected region.", "Error")
     sys.exit("Operation cancelled by the user.")
 
-result = show_element_editor(filtered_elements, region_elements=gathered_elements)
+result = show_element_editor(
+    filtered_elements, region_elements=gathered_elements, tag_by_host=tag_by_host
+)
 if result is None:
     sys.exit("Operation cancelled by the user.")
 
 uidoc.Selection.SetElementIds(List[ElementId]())
 
+# region elements are already in hand; only tags added in the editor need
+# a doc.GetElement round trip
+elem_by_id = dict((e.Id.IntegerValue, e) for e in gathered_elements)
+
 baseCode = result["TextNote"]
 for eData in result["Elements"]:
     if eData["Category"] == "Pipe Fittings":
@@ -1606,26 +2026,25 @@ for eData in result["Elements"]:
 # --- Renumber Pipes based on region order (sorted left-to-right, bottom-to-up) ---
 if not result.get("TextNotePlaced", False):
     base_raw = result.get("TextNote", "").strip()
-    m = re.search(r"([\d\.]+)", base_raw)
+    m = _BASE_RE.search(base_raw)
     base = m.group(1) if m else "0"
 
-    pipe_entries = []
+    pipe_idx, pipe_keys = [], []
     for idx, eData in enumerate(result["Elements"]):
         if eData["Category"] == "Pipes":
-            elem = doc.GetElement(ElementId(int(str(eData["Id"]))))
+            elem = elem_by_id.get(int(str(eData["Id"])))
             if elem:
-                bbox = elem.get_BoundingBox(uidoc.ActiveView)
-                if bbox:
-                    center = XYZ(
-                        (bbox.Min.X + bbox.Max.X) / 2.0,
-                        (bbox.Min.Y + bbox.Max.Y) / 2.0,
-                        (bbox.Min.Z + bbox.Max.Z) / 2.0,
-                    )
-                    pipe_entries.append((idx, center))
-    pipe_entries.sort(key=lambda x: (x[1].X, x[1].Y))
+                key = get_plan_sort_key(elem)
+                if key is not None:
+                    pipe_idx.append(idx)
+                    pipe_keys.append(key)
+    # packed (x, y) int keys; the sort is stable so ties keep row order
+    pipe_entries = [
+        pipe_idx[k] for k in sorted(range(len(pipe_keys)), key=pipe_keys.__getitem__)
+    ]
 
     ctr = 1
-    for i, _ in pipe_entries:
+    for i in pipe_entries:
         result["Elements"][i]["NewCode"] = base + "." + str(ctr)
         ctr += 1
 
@@ -1633,152 +2052,32 @@ if not result.get("TextNotePlaced", False):
         if eData["Category"] == "Pipe Fittings":
             eData["NewCode"] = base
 
-# --- Update the elements' "Comments" from the DataGridView ---
-t = Transaction(doc, "Update Comments")
-t.Start()
-for eData in result["Elements"]:
-    # skip rows where Id is missing or not an integer
-    id_val = eData.get("Id")
-    try:
-        eid = int(str(id_val))
-    except (TypeError, ValueError):
-        continue
-
-    elem = doc.GetElement(ElementId(eid))
-    if not elem:
-        continue
-    # get the Comments parameter
-    p = elem.LookupParameter("Comments")
-    if not p or p.IsReadOnly:
-        continue
-
-    # if this is a fitting, force it to the base sheet code
-    if eData["Category"] == "Pipe Fittings":
-        # result ["TextNote"] holds exactly the text you placed e.g. "5.1.1"
-        p.Set(result["TextNote"])
-    else:
-        # pipes & tags keep their full NewCode
-        p.Set(str(eData["NewCode"]))
-t.Commit()
-
-# --- Place the text note if not already placed ---
-if not result.get("TextNotePlaced", False):
-    (region_min, region_max) = get_region_bounding_box(gathered_elements)
-    view = doc.ActiveView
-    corner = region_min
-    ttn = Transaction(doc, "Place Text Note at Region Corner")
-    ttn.Start()
-    nt = FilteredElementCollector(doc).OfClass(TextNoteType).FirstElement()
-    if nt:
-        opts = TextNoteOptions(nt.Id)
-        TextNote.Create(
-            doc, doc.ActiveView.Id, corner, result.get("TextNote", base), opts
-        )
-    ttn.Commit()
-
-region_min, region_max = get_region_bounding_box(gathered_elements)
-
-orig = uidoc.ActiveView
-if orig.ViewType != ViewType.FloorPlan:
-    MessageBox.Show("Active view is not a Floor Plan!", "Error")
-    sys.exit()
-
-# grab the original crop box transform so the region maps to the same coordinate system
-orig_bb = orig.CropBox
-orig_trans = orig_bb.Transform
-
-tx = Transaction(doc, "Create Cropped Plan View")
-tx.Start()
-
-# Duplicate With Detailing so all your pipe-tags (Independent Tag) come over
-new_id = orig.Duplicate(ViewDuplicateOption.WithDetailing)
-new_view = doc.GetElement(new_id)
-
-# remove any view template and set scale to 1:25
-new_view.ViewTemplateId = ElementId.InvalidElementId
-
-# force it to Coordination
-new_view.Discipline = ViewDiscipline.Coordination
-new_view.Scale = 25
-
-# naming, cropping, discipline etc...
-m = re.search(r"([\d\.]+)", result["TextNote"])
-base = m.group(1) if m else result["TextNote"].strip()  # "5.1.1"
-try:
-    new_view.Name = base
-except ArgumentException:
-    MessageBox.Show(
-        "A view named '{0}' already exists!\n\n"
-        "Please pick a different code in the text-node editor.".format(base),
-        "Duplicate View Name",
-    )
-    tx.RollBack()
-    sys.exit("Duplicate View Name")
-# apply region crop using the same transform
-bb = BoundingBoxXYZ()
-bb.Min = region_min
-bb.Max = region_max
-bb.Transform = orig_trans
-
-new_view.CropBoxActive = True
-new_view.CropBoxVisible = True
-# new_view.CropBox = bb
-
-# turn on annotation crop
-annoParam = new_view.get_Parameter(BuiltInParameter.VIEWER_ANNOTATION_CROP_ACTIVE)
-if annoParam and not annoParam.IsReadOnly:
-    annoParam.Set(1)
-
-new_view.CropBox = bb
-
-# Hide crop region controls (but keep border visible)
-param = new_view.get_Parameter(BuiltInParameter.VIEWER_CROP_REGION_VISIBLE)
-if param and not param.IsReadOnly:
-    param.Set(0)
-
-# Hide temporary blue dimensions
-# temp_dim_param = new_view.get_Parameter(BuiltInParameter.VIEWER_TEMP_DIM_VISIBLE)
-# if temp_dim_param and not temp_dim_param.IsReadOnly:
-#     temp_dim_param.Set(0)
-
-# Hide pipe drag handles (blue grip boxes)
-cat_drag_controls = doc.Settings.Categories.get_Item(BuiltInCategory.OST_ConnectorElem)
-if cat_drag_controls and new_view.CanCategoryBeHidden(cat_drag_controls.Id):
-    new_view.SetCategoryHidden(cat_drag_controls.Id, True)
-
-tx.Commit()
-# -----------------------------------------
-# 2) SHOW TITLE-BLOCK PICKER, THEN CREATE SHEET
-# -----------------------------------------
-
-# collect title‑blocks
-all_tbs = list(
-    FilteredElementCollector(doc)
-    .OfCategory(BuiltInCategory.OST_TitleBlocks)
-    .OfClass(FamilySymbol)
-    .ToElements()
-)
-
-if not all_tbs:
-    MessageBox.Show("No title‑block types found.", "Error")
-    sys.exit()
-
 
+# --- Helpers and settings for the sheet steps below
 class TBPicker(Form):
     def __init__(self, tbs):
-        self.tbs = tbs
         self.Text = "Choose a Title‑Block"
         self.ClientSize = Size(300, 350)
 
         # ListBox
         self.lb = ListBox()
         self.lb.Bounds = Rectangle(10, 10, 280, 280)
+        entries = []
         for sym in tbs:
             fam = sym.FamilyName
             type_name = (
                 sym.get_Parameter(BuiltInParameter.SYMBOL_NAME_PARAM).AsString() or ""
             )
-            self.lb.Items.Add(fam + " - " + type_name)
+            entries.append((fam + " - " + type_name, sym))
+        # sorted once here; self.tbs follows the same order so SelectedIndex
+        # still maps straight to its symbol
+        entries.sort(key=lambda e: e[0])
+        labels = [label for label, _ in entries]
+        self.tbs = [sym for _, sym in entries]
+        # one AddRange inside Begin/EndUpdate instead of a redraw per item
+        self.lb.BeginUpdate()
+        self.lb.Items.AddRange(Array[object](labels))
+        self.lb.EndUpdate()
         self.Controls.Add(self.lb)
 
         # OK / Cancel
@@ -1792,153 +2091,340 @@ class TBPicker(Form):
         self.CancelButton = ca
 
 
-existing_sheets = FilteredElementCollector(doc).OfClass(ViewSheet).ToElements()
-existing_numbers = {s.SheetNumber for s in existing_sheets}
+TEMPLATE_3D_NAME = "S4R_A00_Algemeen_3D"
+VIEW_NAME_PARAM = ElementId(BuiltInParameter.VIEW_NAME)
 
-# show the picker
-picker = TBPicker(all_tbs)
-if picker.ShowDialog() != DialogResult.OK or picker.lb.SelectedIndex < 0:
-    MessageBox.Show("Sheet creation cancelled.", "Info")
-    sys.exit()
 
-title_block = all_tbs[picker.lb.SelectedIndex]
+def view_name_filter(evaluator, text):
+    """ElementParameterFilter on the view name, evaluated inside Revit."""
+    provider = ParameterValueProvider(VIEW_NAME_PARAM)
+    if _HAS_3ARG_STRING_RULE:
+        rule = FilterStringRule(provider, evaluator, text)
+    else:
+        rule = FilterStringRule(provider, evaluator, text, True)
+    return ElementParameterFilter(rule)
 
-# ————————————————————————————————
-# 3) Create A3 sheets, skipping duplicates
-# ————————————————————————————————
 
-# b) for each base, only create if it’s not already on a sheet
-for base in {base}:  # e.g. 5.1.1
-    if base in existing_numbers:
-        MessageBox.Show(
-            "Sheet 'prefab {0}' already exists!\n\n"
-            "Please pick a different code in the text-note editor.".format(base),
-            "Duplicate Sheet",
-        )
-        sys.exit("Duplicate sheet number")
-    t3 = Transaction(doc, "Create 3D callout")
-    t3.Start()
-    sheet = ViewSheet.Create(doc, title_block.Id)
-    sheet.SheetNumber = base
-    sheet.Name = "Prefab " + base
-
-    # Get placed title block instance and its bounding box
-    titleblock_inst = next(
-        (
-            e
-            for e in FilteredElementCollector(doc, sheet.Id)
-            .OfClass(FamilyInstance)
-            .ToElements()
-            if e.Symbol.Id == title_block.Id
-        ),
-        None,
-    )
+def sheet_number_exists(number):
+    """True if a sheet already uses this number; stops at the first match."""
+    for vs in FilteredElementCollector(doc).OfClass(ViewSheet):
+        if vs.SheetNumber == number:
+            return True
+    return False
+
+
+# --- Helper function to find field by name
+def find_schedule_field_by_name(sd, field_name):
+    for f_id in sd.GetFieldOrder():
+        sf = sd.GetField(f_id)
+        if sf.GetName() == field_name:
+            return sf
+    raise Exception("Field not found: {}".format(field_name))
+
+
+FITTINGS_MASTER_NAME = "Geberit PE fittingen"
+PIPES_MASTER_NAME = "Geberit PE leidingen"
+
+# Comments parameter id as a plain int, so the field scans below compare ints
+COMMENTS_PARAM_INT = ElementId(COMMENTS_BIP).IntegerValue
+
+# transactions started during the run, so an error can roll back whichever
+# one is still open before the run group is closed
+_run_transactions = []
 
-    tb_bb = titleblock_inst.get_BoundingBox(sheet) if titleblock_inst else None
-    if not tb_bb:
-        MessageBox.Show("Could not retrieve title block bounding box.", "Error")
+
+def start_transaction(name):
+    """Start a Transaction and register it with the run."""
+    tx = Transaction(doc, name)
+    tx.Start()
+    _run_transactions.append(tx)
+    return tx
+
+
+# every step below commits its own transaction; the run-wide group merges
+# them into a single undo step for the whole prefab run
+run_tg = TransactionGroup(doc, "Smart Piping Sheet")
+run_tg.Start()
+
+try:
+    # --- Update the elements' "Comments" from the DataGridView ---
+    t = start_transaction("Update Comments")
+    for eData in result["Elements"]:
+        # skip rows where Id is missing or not an integer
+        id_val = eData.get("Id")
+        try:
+            eid = int(str(id_val))
+        except (TypeError, ValueError):
+            continue
+
+        elem = elem_by_id.get(eid)
+        if elem is None:
+            elem = doc.GetElement(ElementId(eid))
+        if not elem or not elem.IsValidObject:
+            continue
+        # get the Comments parameter
+        p = elem.get_Parameter(COMMENTS_BIP)
+        if not p or p.IsReadOnly:
+            continue
+
+        # if this is a fitting, force it to the base sheet code
+        if eData["Category"] == "Pipe Fittings":
+            # result ["TextNote"] holds exactly the text you placed e.g. "5.1.1"
+            new_value = result["TextNote"]
+        else:
+            # pipes & tags keep their full NewCode
+            new_value = str(eData["NewCode"])
+        # an unchanged Set still marks the element modified
+        if p.AsString() != new_value:
+            p.Set(new_value)
+    t.Commit()
+
+    # --- Place the text note if not already placed ---
+    if not result.get("TextNotePlaced", False):
+        (region_min, region_max) = get_region_bounding_box(gathered_elements)
+        view = doc.ActiveView
+        corner = region_min
+        ttn = start_transaction("Place Text Note at Region Corner")
+        nt = get_default_text_note_type()
+        if nt:
+            opts = TextNoteOptions(nt.Id)
+            TextNote.Create(
+                doc, doc.ActiveView.Id, corner, result.get("TextNote", base), opts
+            )
+        ttn.Commit()
+
+    region_min, region_max = get_region_bounding_box(gathered_elements)
+
+    orig = uidoc.ActiveView
+    if orig.ViewType != ViewType.FloorPlan:
+        MessageBox.Show("Active view is not a Floor Plan!", "Error")
         sys.exit()
 
-    # Center of the actual debugable area (inner region of the title block)
-    tb_center = XYZ(
-        (tb_bb.Min.X + tb_bb.Max.X) / 2,
-        (tb_bb.Min.Y + tb_bb.Max.Y) / 2,
-        0,
-    )
+    # grab the original crop box transform so the region maps to the same
+    # coordinate system
+    orig_bb = orig.CropBox
+    orig_trans = orig_bb.Transform
+
+    tx = start_transaction("Create Cropped Plan View")
+
+    # Duplicate With Detailing so all your pipe-tags (Independent Tag) come over
+    new_id = orig.Duplicate(ViewDuplicateOption.WithDetailing)
+    new_view = doc.GetElement(new_id)
 
-    # Place the main floor plan view centered in title block region
-    Viewport.Create(doc, sheet.Id, new_view.Id, tb_center)
-
-    # ------------------------------------------
-    # 4) Create & place 3D callout
-    # ------------------------------------------
-    all3ds = FilteredElementCollector(doc).OfClass(ViewFamilyType).ToElements()
-    all3d_views = FilteredElementCollector(doc).OfClass(View3D).ToElements()
-    # 1. pick a 3D ViewFamilyType
-    prefix = "{} - Sheet".format(base)
-    existing_count = sum(1 for v in all3d_views if v.Name.startswith(prefix))
-
-    v3d_type = next(v for v in all3ds if v.ViewFamily == ViewFamily.ThreeDimensional)
-
-    # split off the last number of the base code
-    parts = base.split(".")
-    major = ".".join(parts[:-1])
-    last = int(parts[-1])
-    new_last = last + existing_count
-    sheet_suffix = "{}.{}".format(major, new_last)
-
-    # 2. create an isometric 3D view
-    view3d = View3D.CreateIsometric(doc, v3d_type.Id)
-    view3d.Name = "{} - Sheet {}".format(base, sheet_suffix)
-    # force it into the Architectural branch of the browser
-    view3d.Discipline = ViewDiscipline.Architectural
-    view3d.Scale = 25
-
-    # apply your A00_Algemeen 3D View Template
-    tmpl = next(
-        (v for v in all3d_views if v.IsTemplate and v.Name == "S4R_A00_Algemeen_3D"),
-        None,
+    # remove any view template and set scale to 1:25; the template id is read
+    # once and compared as an int, so an untemplated view isn't written to
+    if new_view.ViewTemplateId.IntegerValue != -1:
+        new_view.ViewTemplateId = ElementId.InvalidElementId
+
+    # force it to Coordination
+    new_view.Discipline = ViewDiscipline.Coordination
+    new_view.Scale = 25
+
+    # naming, cropping, discipline etc...
+    m = _BASE_RE.search(result["TextNote"])
+    base = m.group(1) if m else result["TextNote"].strip()  # "5.1.1"
+    try:
+        new_view.Name = base
+    except ArgumentException:
+        MessageBox.Show(
+            "A view named '{0}' already exists!\n\n"
+            "Please pick a different code in the text-node editor.".format(base),
+            "Duplicate View Name",
+        )
+        tx.RollBack()
+        sys.exit("Duplicate View Name")
+    # apply region crop using the same transform
+    bb = BoundingBoxXYZ()
+    bb.Min = region_min
+    bb.Max = region_max
+    bb.Transform = orig_trans
+
+    new_view.CropBoxActive = True
+    new_view.CropBoxVisible = True
+    # new_view.CropBox = bb
+
+    # turn on annotation crop
+    annoParam = new_view.get_Parameter(BuiltInParameter.VIEWER_ANNOTATION_CROP_ACTIVE)
+    if annoParam and not annoParam.IsReadOnly:
+        annoParam.Set(1)
+
+    new_view.CropBox = bb
+
+    # Hide crop region controls (but keep border visible)
+    param = new_view.get_Parameter(BuiltInParameter.VIEWER_CROP_REGION_VISIBLE)
+    if param and not param.IsReadOnly:
+        param.Set(0)
+
+    # Hide temporary blue dimensions
+    # temp_dim_param = new_view.get_Parameter(BuiltInParameter.VIEWER_TEMP_DIM_VISIBLE)
+    # if temp_dim_param and not temp_dim_param.IsReadOnly:
+    #     temp_dim_param.Set(0)
+
+    # Hide pipe drag handles (blue grip boxes)
+    cat_drag_controls = doc.Settings.Categories.get_Item(
+        BuiltInCategory.OST_ConnectorElem
     )
-    if tmpl:
-        view3d.ViewTemplateId = tmpl.Id
+    if cat_drag_controls and new_view.CanCategoryBeHidden(cat_drag_controls.Id):
+        new_view.SetCategoryHidden(cat_drag_controls.Id, True)
 
-    param = view3d.get_Parameter(BuiltInParameter.VIEW_DISCIPLINE)
-    if not param.IsReadOnly:
-        param.Set(int(ViewDiscipline.Architectural))
+    tx.Commit()
+    # -----------------------------------------
+    # 2) SHOW TITLE-BLOCK PICKER, THEN CREATE SHEET
+    # -----------------------------------------
 
-    # 3. use the same region bounding box you computed earlier
-    section_bb = BoundingBoxXYZ()
-    section_bb.Min = region_min
-    section_bb.Max = region_max
-    view3d.SetSectionBox(section_bb)
+    # collect title‑blocks
+    all_tbs = list(
+        FilteredElementCollector(doc)
+        .OfCategory(BuiltInCategory.OST_TitleBlocks)
+        .OfClass(FamilySymbol)
+        .ToElements()
+    )
 
-    view3d.IsSectionBoxActive = True
-    section_box = view3d.GetSectionBox()
-    if section_box:
-        section_box.Enabled = True
+    if not all_tbs:
+        MessageBox.Show("No title‑block types found.", "Error")
+        sys.exit()
 
-    viewport_spacing = 0.25  # adjust as needed for spacing
-    v3d_pos = XYZ(tb_center.X + viewport_spacing, tb_center.Y + viewport_spacing, 0)
-    Viewport.Create(doc, sheet.Id, view3d.Id, v3d_pos)
+    # show the picker
+    picker = TBPicker(all_tbs)
+    if picker.ShowDialog() != DialogResult.OK or picker.lb.SelectedIndex < 0:
+        MessageBox.Show("Sheet creation cancelled.", "Info")
+        sys.exit()
 
-    t3.Commit()
+    title_block = picker.tbs[picker.lb.SelectedIndex]
 
+    # ————————————————————————————————
+    # 3) Create A3 sheets, skipping duplicates
+    # ————————————————————————————————
 
-# --- Helper function to find field by name
-def find_schedule_field_by_name(sd, field_name):
-    for f_id in sd.GetFieldOrder():
-        sf = sd.GetField(f_id)
-        if sf.GetName() == field_name:
-            return sf
-    raise Exception("Field not found: {}".format(field_name))
+    # viewports placed below; kept so they can be centred without re-collecting
+    placed_viewports = []
 
+    # b) for each base, only create if it’s not already on a sheet
+    for base in {base}:  # e.g. 5.1.1
+        if sheet_number_exists(base):
+            MessageBox.Show(
+                "Sheet 'prefab {0}' already exists!\n\n"
+                "Please pick a different code in the text-note editor.".format(base),
+                "Duplicate Sheet",
+            )
+            sys.exit("Duplicate sheet number")
+
+        t3 = start_transaction("Create 3D callout")
+        suppress_warnings(t3)
+        sheet = ViewSheet.Create(doc, title_block.Id)
+        sheet.SheetNumber = base
+        sheet.Name = "Prefab " + base
+
+        # Get placed title block instance and its bounding box; the quick
+        # category filter runs first so the slower FamilyInstanceFilter only
+        # sees title blocks, not every element owned by the sheet
+        titleblock_inst = (
+            FilteredElementCollector(doc, sheet.Id)
+            .OfCategory(BuiltInCategory.OST_TitleBlocks)
+            .WherePasses(FamilyInstanceFilter(doc, title_block.Id))
+            .FirstElement()
+        )
 
-# --- Main script
-all_schedules = FilteredElementCollector(doc).OfClass(ViewSchedule).ToElements()
-fittings_master = next(s for s in all_schedules if s.Name == "Geberit PE fittingen")
-pipes_master = next(s for s in all_schedules if s.Name == "Geberit PE leidingen")
+        tb_bb = titleblock_inst.get_BoundingBox(sheet) if titleblock_inst else None
+        if not tb_bb:
+            MessageBox.Show("Could not retrieve title block bounding box.", "Error")
+            t3.RollBack()
+            sys.exit()
+
+        # Center of the actual debugable area (inner region of the title block)
+        tb_center = XYZ(
+            (tb_bb.Min.X + tb_bb.Max.X) / 2,
+            (tb_bb.Min.Y + tb_bb.Max.Y) / 2,
+            0,
+        )
 
-t = Transaction(doc, "Duplicate & Configure Schedules")
-t.Start()
+        # Place the main floor plan view centered in title block region
+        placed_viewports.append(Viewport.Create(doc, sheet.Id, new_view.Id, tb_center))
+
+        # ------------------------------------------
+        # 4) Create & place 3D callout
+        # ------------------------------------------
+        all3ds = FilteredElementCollector(doc).OfClass(ViewFamilyType).ToElements()
+        # 1. pick a 3D ViewFamilyType
+        prefix = "{} - Sheet".format(base)
+
+        # one pass over the 3D views whose name Revit has already matched
+        # natively: count earlier sheets for this base and find the
+        # A00_Algemeen 3D template. The name is re-checked in Python to keep
+        # the match case-exact.
+        name_filter = LogicalOrFilter(
+            view_name_filter(FilterStringBeginsWith(), prefix),
+            view_name_filter(FilterStringEquals(), TEMPLATE_3D_NAME),
+        )
+        existing_count = 0
+        tmpl = None
+        for v in FilteredElementCollector(doc).OfClass(View3D).WherePasses(name_filter):
+            name = v.Name
+            if v.IsTemplate:
+                if tmpl is None and name == TEMPLATE_3D_NAME:
+                    tmpl = v
+            elif name.startswith(prefix):
+                existing_count += 1
+
+        v3d_type = next(
+            v for v in all3ds if v.ViewFamily == ViewFamily.ThreeDimensional
+        )
 
-sheet_code = sheet.SheetNumber
-tasks = [
-    (fittings_master, False, 0),
-    (pipes_master, True, 1),
-]
+        # split off the last number of the base code
+        parts = base.split(".")
+        major = ".".join(parts[:-1])
+        last = int(parts[-1])
+        new_last = last + existing_count
+        sheet_suffix = "{}.{}".format(major, new_last)
+
+        # 2. create an isometric 3D view
+        view3d = View3D.CreateIsometric(doc, v3d_type.Id)
+        view3d.Name = "{} - Sheet {}".format(base, sheet_suffix)
+        # force it into the Architectural branch of the browser
+        view3d.Discipline = ViewDiscipline.Architectural
+        view3d.Scale = 25
+
+        # apply your A00_Algemeen 3D View Template
+        if tmpl:
+            view3d.ViewTemplateId = tmpl.Id
+
+        param = view3d.get_Parameter(BuiltInParameter.VIEW_DISCIPLINE)
+        if not param.IsReadOnly:
+            param.Set(int(ViewDiscipline.Architectural))
+
+        # 3. use the same region bounding box you computed earlier
+        section_bb = BoundingBoxXYZ()
+        section_bb.Min = region_min
+        section_bb.Max = region_max
+        view3d.SetSectionBox(section_bb)
+
+        view3d.IsSectionBoxActive = True
+        section_box = view3d.GetSectionBox()
+        if section_box:
+            section_box.Enabled = True
+
+        viewport_spacing = 0.25  # adjust as needed for spacing
+        v3d_pos = XYZ(tb_center.X + viewport_spacing, tb_center.Y + viewport_spacing, 0)
+        placed_viewports.append(Viewport.Create(doc, sheet.Id, view3d.Id, v3d_pos))
+
+        t3.Commit()
+
+    # --- Schedules
+    # one pass over the schedules, indexed by name (first match wins)
+    schedules_by_name = {}
+    for vs in FilteredElementCollector(doc).OfClass(ViewSchedule):
+        schedules_by_name.setdefault(vs.Name, vs)
+    fittings_master = schedules_by_name[FITTINGS_MASTER_NAME]
+    pipes_master = schedules_by_name[PIPES_MASTER_NAME]
 
-for master, is_pipe, idx in tasks:
-    # --- duplicate & rename ---
-    dup_id = master.Duplicate(ViewDuplicateOption.Duplicate)
-    dup = doc.GetElement(dup_id)
-    dup.Name = "{} {}".format(master.Name, sheet_code)
     # Convert 1.5 mm to internal Revit feet (1 foot = 304.8 mm)
     target_font = "Arial"
     target_mm = 1.5
     target_ft = target_mm / 304.8
 
-    # Search existing text types
-    text_types = FilteredElementCollector(doc).OfClass(TextNoteType).ToElements()
+    # Search existing text types once for both schedules; a missing type is
+    # created here, in its own transaction, before the schedule transaction opens
+    text_types = get_text_note_types()
     matching_type = None
     for tt in text_types:
         try:
@@ -1953,143 +2439,207 @@ for master, is_pipe, idx in tasks:
     # If not found, duplicate the first one and create the target
     if not matching_type and text_types:
         source_type = text_types[0]
-        t = Transaction(doc, "Create Arial 1.5mm Text Type")
-        t.Start()
+        tt_tx = start_transaction("Create Arial 1.5mm Text Type")
         new_type_id = source_type.Duplicate("Arial 1.5mm")
         new_type = doc.GetElement(new_type_id)
         new_type.get_Parameter(BuiltInParameter.TEXT_FONT).Set(target_font)
         new_type.get_Parameter(BuiltInParameter.TEXT_SIZE).Set(target_ft)
-        t.Commit()
+        tt_tx.Commit()
         matching_type = new_type
 
-    # Apply it to the schedule view if available
-    if matching_type:
-        dup.TitleTextTypeId = matching_type.Id
-        dup.HeaderTextTypeId = matching_type.Id
-        dup.BodyTextTypeId = matching_type.Id
-
-    sd = dup.Definition
-    # --- if it's a Leidingen (pipes) schedule, change Length field to millimeters ---
-    if is_pipe:
-        for f_id in sd.GetFieldOrder():
-            field = sd.GetField(f_id)
-            if field.GetName().lower().startswith("length"):
-                opts = field.GetFormatOptions()
-                opts.UseDefault = False
-                opts.SetUnitTypeId(UnitTypeId.Millimeters)
-                opts.Accuracy = 0.1
-                field.SetFormatOptions(opts)
-                break
-    comments_param = ElementId(BuiltInParameter.ALL_MODEL_INSTANCE_COMMENTS)
-
-    # --- find the schedule-field ID that corresponds to "Comments" ---
-    comment_field = None
-    for f_id in sd.GetFieldOrder():
-        sf = sd.GetField(f_id)
-        if sf.ParameterId == comments_param:
-            comment_field = sf
-            break
-
-    # If "Comments" column not found yet, add it
-    if comment_field is None:
-        cm_sched_field = next(
-            f for f in sd.GetSchedulableFields() if f.ParameterId == comments_param
+    # placement plan, worked out before the transaction opens: the sheet outline
+    # is read once and each schedule gets its name and insertion point up front
+    sheet_code = sheet.SheetNumber
+    outline = sheet.Outline
+    uMin, uMax = outline.Min.U, outline.Max.U
+    vMin, vMax = outline.Min.V, outline.Max.V
+    w, h = (uMax - uMin), (vMax - vMin)
+    tasks = []
+    for idx, (master, is_pipe) in enumerate(
+        [(fittings_master, False), (pipes_master, True)]
+    ):
+        x = uMin + 0.05 * w
+        y = vMin + (0.05 + 0.3 * idx) * h
+        tasks.append(
+            (master, is_pipe, "{} {}".format(master.Name, sheet_code), XYZ(x, y, 0))
         )
-        sf = sd.AddField(cm_sched_field)
-        comment_field = sf
-
-    comment_field_id = comment_field.FieldId
-
-    # --- clear out any existing Comments-filters ---
-    for i in reversed(range(sd.GetFilterCount())):
-        f = sd.GetFilter(i)
-        if f.FieldId == comment_field_id:
-            sd.RemoveFilter(i)
-
-    # --- add the new filter (Contains for both pipes and fittings now) ---
-    ftype = ScheduleFilterType.Contains
-    sd.AddFilter(ScheduleFilter(comment_field_id, ftype, sheet_code))
-
-    # --- clear sort fields safely
-    for i in reversed(range(sd.GetSortGroupFieldCount())):
-        sd.RemoveSortGroupField(i)
-
-    # --- add correct sorting based on schedule type
-    if is_pipe:
-        # Leidingen sorting
-        seg_field = find_schedule_field_by_name(sd, "Segment Description")
-        art_field = find_schedule_field_by_name(sd, "Article Nr")
-        od_field = find_schedule_field_by_name(sd, "Outside Diameter")
-
-        grp1 = ScheduleSortGroupField(seg_field.FieldId, ScheduleSortOrder.Ascending)
-        grp1.ShowHeader = True
-        sd.AddSortGroupField(grp1)
-
-        grp2 = ScheduleSortGroupField(art_field.FieldId, ScheduleSortOrder.Ascending)
-        sd.AddSortGroupField(grp2)
 
-        grp3 = ScheduleSortGroupField(od_field.FieldId, ScheduleSortOrder.Ascending)
-        sd.AddSortGroupField(grp3)
+    t = start_transaction("Duplicate, Configure & Place Schedules")
+    suppress_warnings(t)
 
-        dup.Definition.IsItemized = True
+    # schedule instances that made it onto the sheet, in placement order
+    placed_schedules = []
+    # (master schedule name, error) for every schedule that was rolled back
+    failed_schedules = []
 
-    else:
-        # Fittingen sorting
-        cm_field = find_schedule_field_by_name(sd, "Comments")
-        prod_field = find_schedule_field_by_name(sd, "NLRS_C_code_fabrikant_product")
-
-        grp1 = ScheduleSortGroupField(cm_field.FieldId, ScheduleSortOrder.Ascending)
-        grp1.ShowHeader = True
-        sd.AddSortGroupField(grp1)
+    for master, is_pipe, dup_name, place_pt in tasks:
+        # each schedule gets its own rollback point, so a master missing a
+        # field doesn't abort the sheet's other schedule
+        st = SubTransaction(doc)
+        st.Start()
+        try:
+            # --- duplicate & rename ---
+            dup_id = master.Duplicate(ViewDuplicateOption.Duplicate)
+            dup = doc.GetElement(dup_id)
+            dup.Name = dup_name
+            # Apply it to the schedule view if available
+            if matching_type:
+                dup.TitleTextTypeId = matching_type.Id
+                dup.HeaderTextTypeId = matching_type.Id
+                dup.BodyTextTypeId = matching_type.Id
+
+            sd = dup.Definition
+            # --- Leidingen (pipes) schedule: change Length field to millimeters ---
+            if is_pipe:
+                for f_id in sd.GetFieldOrder():
+                    field = sd.GetField(f_id)
+                    if field.GetName().lower().startswith("length"):
+                        opts = field.GetFormatOptions()
+                        opts.UseDefault = False
+                        opts.SetUnitTypeId(UnitTypeId.Millimeters)
+                        opts.Accuracy = 0.1
+                        field.SetFormatOptions(opts)
+                        break
+            # --- find the schedule-field ID that corresponds to "Comments" ---
+            comment_field = None
+            for f_id in sd.GetFieldOrder():
+                sf = sd.GetField(f_id)
+                if sf.ParameterId.IntegerValue == COMMENTS_PARAM_INT:
+                    comment_field = sf
+                    break
 
-        grp2 = ScheduleSortGroupField(prod_field.FieldId, ScheduleSortOrder.Ascending)
-        sd.AddSortGroupField(grp2)
+            # If "Comments" column not found yet, add it
+            if comment_field is None:
+                cm_sched_field = next(
+                    f
+                    for f in sd.GetSchedulableFields()
+                    if f.ParameterId.IntegerValue == COMMENTS_PARAM_INT
+                )
+                sf = sd.AddField(cm_sched_field)
+                comment_field = sf
+
+            comment_field_id = comment_field.FieldId
+            comment_field_int = comment_field_id.IntegerValue
+
+            # --- clear out any existing Comments-filters ---
+            for i in reversed(range(sd.GetFilterCount())):
+                f = sd.GetFilter(i)
+                if f.FieldId.IntegerValue == comment_field_int:
+                    sd.RemoveFilter(i)
+
+            # --- add the new filter (Contains for both pipes and fittings now) ---
+            ftype = ScheduleFilterType.Contains
+            sd.AddFilter(ScheduleFilter(comment_field_id, ftype, sheet_code))
+
+            # --- clear sort fields safely
+            for i in reversed(range(sd.GetSortGroupFieldCount())):
+                sd.RemoveSortGroupField(i)
+
+            # --- add correct sorting based on schedule type
+            if is_pipe:
+                # Leidingen sorting
+                seg_field = find_schedule_field_by_name(sd, "Segment Description")
+                art_field = find_schedule_field_by_name(sd, "Article Nr")
+                od_field = find_schedule_field_by_name(sd, "Outside Diameter")
+
+                grp1 = ScheduleSortGroupField(
+                    seg_field.FieldId, ScheduleSortOrder.Ascending
+                )
+                grp1.ShowHeader = True
+                sd.AddSortGroupField(grp1)
 
-        dup.Definition.IsItemized = False
+                grp2 = ScheduleSortGroupField(
+                    art_field.FieldId, ScheduleSortOrder.Ascending
+                )
+                sd.AddSortGroupField(grp2)
 
-    # --- place the schedule on the sheet
-    uMin, uMax = sheet.Outline.Min.U, sheet.Outline.Max.U
-    vMin, vMax = sheet.Outline.Min.V, sheet.Outline.Max.V
-    w, h = (uMax - uMin), (vMax - vMin)
-    x = uMin + 0.05 * w
-    y = vMin + (0.05 + 0.3 * idx) * h
+                grp3 = ScheduleSortGroupField(
+                    od_field.FieldId, ScheduleSortOrder.Ascending
+                )
+                sd.AddSortGroupField(grp3)
 
-    ScheduleSheetInstance.Create(doc, sheet.Id, dup.Id, XYZ(x, y, 0))
+                dup.Definition.IsItemized = True
 
-t.Commit()
+            else:
+                # Fittingen sorting
+                cm_field = find_schedule_field_by_name(sd, "Comments")
+                prod_field = find_schedule_field_by_name(
+                    sd, "NLRS_C_code_fabrikant_product"
+                )
 
-# ----------------------------------------
-# 6) CENTER PLAN VIEW, 3D VIEW, AND SCHEDULES ON THE SHEET
-# ----------------------------------------
+                grp1 = ScheduleSortGroupField(
+                    cm_field.FieldId, ScheduleSortOrder.Ascending
+                )
+                grp1.ShowHeader = True
+                sd.AddSortGroupField(grp1)
 
-# Start a new transaction to move them
-move_tx = Transaction(doc, "Center Views and Schedules on Sheet")
-move_tx.Start()
+                grp2 = ScheduleSortGroupField(
+                    prod_field.FieldId, ScheduleSortOrder.Ascending
+                )
+                sd.AddSortGroupField(grp2)
 
-# 1. Calculate center of the sheet
-sheet_center = tb_center
+                dup.Definition.IsItemized = False
 
-# 2. Find all viewports on the sheet and center them
-viewports = FilteredElementCollector(doc, sheet.Id).OfClass(Viewport).ToElements()
+            # --- place the schedule on the sheet
+            sched_inst = ScheduleSheetInstance.Create(doc, sheet.Id, dup.Id, place_pt)
 
-for vp in viewports:
-    vp.SetBoxCenter(sheet_center)
+            st.Commit()
+            placed_schedules.append(sched_inst)
+        except Exception as ex:
+            st.RollBack()
+            failed_schedules.append((master.Name, ex))
+            debug("❌ Failed to set up schedule from", master.Name, ":", ex)
+
+    # ----------------------------------------
+    # 6) CENTER PLAN VIEW, 3D VIEW, AND SCHEDULES ON THE SHEET
+    # ----------------------------------------
+    # still inside the schedule transaction: one commit for both steps
+
+    # centring runs in its own rollback point, so a failure here can't take the
+    # schedules placed above down with it
+    centre_st = SubTransaction(doc)
+    centre_st.Start()
+    try:
+        # 1. Calculate center of the sheet
+        sheet_center = tb_center
 
-# 3. Find all schedules on the sheet and center them nicely stacked
-schedules = (
-    FilteredElementCollector(doc, sheet.Id).OfClass(ScheduleSheetInstance).ToElements()
-)
+        # 2. Center the viewports placed on the sheet
+        for vp in placed_viewports:
+            vp.SetBoxCenter(sheet_center)
 
-schedule_offset = 0.15  # Offset down between schedules (adjust if needed)
-normal_schedules = []
+        # 3. Center the placed schedules nicely stacked (the title block's revision
+        #    schedule is never in this list)
+        schedule_offset = 0.15  # Offset down between schedules (adjust if needed)
 
-for sch in schedules:
-    if sch.IsTitleblockRevisionSchedule:
-        continue
-    normal_schedules.append(sch)
+        for idx, sch in enumerate(placed_schedules):
+            sch_point = XYZ(sheet_center.X, sheet_center.Y - (idx * schedule_offset), 0)
+            sch.Point = sch_point
 
-for idx, sch in enumerate(normal_schedules):
-    sch_point = XYZ(sheet_center.X, sheet_center.Y - (idx * schedule_offset), 0)
-    sch.Point = sch_point
+        centre_st.Commit()
+    except Exception as ex:
+        centre_st.RollBack()
+        MessageBox.Show(
+            "Could not centre the views and schedules on the sheet:\n\n{}".format(ex),
+            "Warning",
+        )
 
-move_tx.Commit()
+    t.Commit()
+except Exception as ex:
+    MessageBox.Show("Prefab sheet generation stopped:\n\n{}".format(ex), "Error")
+    raise
+finally:
+    # roll back the step that was still open, then keep what the earlier
+    # steps committed (sys.exit and errors alike end up here)
+    for open_tx in reversed(_run_transactions):
+        if open_tx.HasStarted() and not open_tx.HasEnded():
+            open_tx.RollBack()
+    if run_tg.HasStarted() and not run_tg.HasEnded():
+        run_tg.Assimilate()
+
+if failed_schedules:
+    details = "\n".join("- {}: {}".format(name, ex) for name, ex in failed_schedules)
+    MessageBox.Show(
+        "These schedules could not be set up and are missing from sheet "
+        "{}:\n\n{}".format(sheet_code, details),
+        "Schedules Missing",
+    )